@@ -0,0 +1,236 @@
+import json
+from bisect import bisect_left
+import re
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Minimaler InfluxDB-1.x-Ersatz für die Benchmarks: nimmt Line-Protokoll über /write an,
+# hält die Werte im Speicher und beantwortet genau die Abfrageformen, die ha_to_influx.py
+# und das Dashboard erzeugen. Unbekannte Abfragen werden wie von InfluxDB mit "error" beantwortet.
+
+SHOW_SERIES = re.compile(r'^SHOW SERIES FROM "?(\w+)"?$')
+SELECT_LAST = re.compile(r'^SELECT last\("value"\) FROM "?(\w+)"? GROUP BY entity_id$')
+SELECT_RANGE = re.compile(
+    r'^SELECT "value" FROM "?(\w+)"? WHERE time >= \'([^\']+)\' AND time < \'([^\']+)\' GROUP BY entity_id$')
+SELECT_EXPORT = re.compile(
+    r'^SELECT "value" FROM "?(\w+)"? WHERE time >= \'([^\']+)\' AND time < \'([^\']+)\' '
+    r'AND \((entity_id = .*)\) GROUP BY entity_id$')
+ENTITY_FILTER = re.compile(r"entity_id = '((?:[^'\\]|\\.)*)'")
+SELECT_SUM = re.compile(
+    r'^SELECT sum\("value"\) AS value FROM "?(\w+)"? WHERE "value" > 0 '
+    r'AND time >= \'([^\']+)\' AND time < \'([^\']+)\' GROUP BY entity_id$')
+SELECT_COUNT = re.compile(
+    r'^SELECT count\("value"\) FROM "?(\w+)"? WHERE time >= \'([^\']+)\' AND time < \'([^\']+)\' '
+    r'GROUP BY time\(1d\), entity_id fill\(none\)$')
+
+def split_unescaped(text, sep, maxsplit=-1):
+    parts, current, escaped = [], [], False
+    for ch in text:
+        if escaped:
+            current.append(ch)
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch == sep and maxsplit != 0:
+            parts.append("".join(current))
+            current = []
+            maxsplit -= 1
+        else:
+            current.append(ch)
+    parts.append("".join(current))
+    return parts
+
+def parse_time(value):
+    return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+
+def format_time(ts, epoch):
+    if epoch == "s":
+        return ts
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+def series_key(measurement, tags):
+    return measurement + "".join(f",{escape(k)}={escape(v)}" for k, v in tags)
+
+class FakeInflux:
+    def __init__(self):
+        self.series = {}
+        self.lines_written = 0
+        self.queries = 0
+        self._lock = threading.Lock()
+        self._sorted = {}
+
+    def write(self, body):
+        written = 0
+        with self._lock:
+            for line in body.splitlines():
+                if not line:
+                    continue
+                key, fields, ts = split_unescaped(line, " ", maxsplit=2)
+                measurement, *tag_parts = split_unescaped(key, ",")
+                tags = tuple(sorted(tuple(part.split("=", 1)) for part in tag_parts))
+                _, value = fields.split("=", 1)
+                self.series.setdefault(measurement, {}).setdefault(tags, {})[int(ts)] = float(value)
+                self._sorted.pop(measurement, None)
+                written += 1
+            self.lines_written += written
+
+    def _by_entity(self, measurement, start=None, end=None):
+        # Sortierte Punkte je entity_id, nach jedem Schreiben des Measurements neu aufgebaut
+        if measurement not in self._sorted:
+            merged = {}
+            for tags, points in self.series.get(measurement, {}).items():
+                merged.setdefault(dict(tags).get("entity_id"), {}).update(points)
+            self._sorted[measurement] = {
+                entity_id: (sorted(points), [points[ts] for ts in sorted(points)])
+                for entity_id, points in merged.items()
+            }
+        selected = {}
+        for entity_id, (times, values) in self._sorted[measurement].items():
+            lo = 0 if start is None else bisect_left(times, start)
+            hi = len(times) if end is None else bisect_left(times, end)
+            selected[entity_id] = list(zip(times[lo:hi], values[lo:hi]))
+        return selected
+
+    def query_chunks(self, statement, epoch=None, chunk_size=10000):
+        # chunked=true: höchstens chunk_size Punkte je Serie und Antwortzeile, wie bei InfluxDB
+        result = self.query(statement, epoch)
+        if "error" in result or not result:
+            yield result
+            return
+        for series in result["series"]:
+            values = series["values"]
+            for offset in range(0, len(values), chunk_size):
+                yield {"series": [dict(series, values=values[offset:offset + chunk_size])], "partial": True}
+
+    def query(self, statement, epoch=None):
+        self.queries += 1
+        statement = statement.strip()
+        with self._lock:
+            if match := SELECT_EXPORT.match(statement):
+                measurement, start, end = match.group(1), parse_time(match.group(2)), parse_time(match.group(3))
+                wanted = {re.sub(r"\\(.)", r"\1", name) for name in ENTITY_FILTER.findall(match.group(4))}
+                series = [
+                    {"name": measurement, "tags": {"entity_id": entity_id}, "columns": ["time", "value"],
+                     "values": [[format_time(ts, epoch), value] for ts, value in points]}
+                    for entity_id, points in self._by_entity(measurement, start, end).items()
+                    if points and entity_id in wanted
+                ]
+                return {"series": series} if series else {}
+
+            if match := SHOW_SERIES.match(statement):
+                keys = [[series_key(match.group(1), tags)] for tags in self.series.get(match.group(1), {})]
+                return {"series": [{"name": match.group(1), "columns": ["key"], "values": keys}]} if keys else {}
+
+            if match := SELECT_LAST.match(statement):
+                measurement = match.group(1)
+                series = [
+                    {"name": measurement, "tags": {"entity_id": entity_id}, "columns": ["time", "last"],
+                     "values": [[format_time(points[-1][0], epoch), points[-1][1]]]}
+                    for entity_id, points in self._by_entity(measurement).items() if points
+                ]
+                return {"series": series} if series else {}
+
+            if match := SELECT_RANGE.match(statement):
+                measurement, start, end = match.group(1), parse_time(match.group(2)), parse_time(match.group(3))
+                series = [
+                    {"name": measurement, "tags": {"entity_id": entity_id}, "columns": ["time", "value"],
+                     "values": [[format_time(ts, epoch), value] for ts, value in points]}
+                    for entity_id, points in self._by_entity(measurement, start, end).items() if points
+                ]
+                return {"series": series} if series else {}
+
+            if match := SELECT_SUM.match(statement):
+                measurement, start, end = match.group(1), parse_time(match.group(2)), parse_time(match.group(3))
+                series = [
+                    {"name": measurement, "tags": {"entity_id": entity_id}, "columns": ["time", "value"],
+                     "values": [[format_time(start, epoch), sum(value for _, value in points if value > 0)]]}
+                    for entity_id, points in self._by_entity(measurement, start, end).items() if points
+                ]
+                return {"series": series} if series else {}
+
+            if match := SELECT_COUNT.match(statement):
+                measurement, start, end = match.group(1), parse_time(match.group(2)), parse_time(match.group(3))
+                series = []
+                for entity_id, points in self._by_entity(measurement, start, end).items():
+                    days = {}
+                    for ts, _ in points:
+                        days[ts - ts % 86400] = days.get(ts - ts % 86400, 0) + 1
+                    if days:
+                        series.append({"name": measurement, "tags": {"entity_id": entity_id},
+                                       "columns": ["time", "count"],
+                                       "values": [[format_time(day, epoch), n] for day, n in sorted(days.items())]})
+                return {"series": series} if series else {}
+
+        return {"error": f"fake influx: unsupported query: {statement}"}
+
+class FakeInfluxHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Kopf und Rumpf in einem Paket senden, sonst bremsen Nagle/Delayed-ACK jede Antwort um ~40 ms
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _params(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8") if length else ""
+        return url.path, params, body
+
+    def _send(self, status, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        self.send_response(status)
+        if payload is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunked(self, results):
+        # Eine JSON-Zeile je Block, per Transfer-Encoding: chunked
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for result in results:
+            line = json.dumps({"results": [dict(statement_id=0, **result)]}).encode("utf-8") + b"\n"
+            self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _handle(self):
+        path, params, body = self._params()
+        if path == "/ping":
+            self._send(204)
+        elif path == "/write":
+            self.server.influx.write(body)
+            self._send(204)
+        elif path == "/query":
+            if "q" not in params and body:
+                params.update({k: v[-1] for k, v in parse_qs(body).items()})
+            statements = [s for s in params.get("q", "").split(";") if s.strip()]
+            if params.get("chunked") == "true" and len(statements) == 1:
+                self._send_chunked(self.server.influx.query_chunks(
+                    statements[0], params.get("epoch"), int(params.get("chunk_size") or 10000)))
+                return
+            results = [dict(statement_id=i, **self.server.influx.query(s, params.get("epoch")))
+                       for i, s in enumerate(statements)]
+            self._send(200, {"results": results})
+        else:
+            self._send(404, {"error": f"unknown path {path}"})
+
+    do_GET = _handle
+    do_POST = _handle
+
+def start_fake_influx(host="127.0.0.1", port=0):
+    server = ThreadingHTTPServer((host, port), FakeInfluxHandler)
+    server.daemon_threads = True
+    server.influx = FakeInflux()
+    threading.Thread(target=server.serve_forever, name="fake-influx", daemon=True).start()
+    return server
@@ -0,0 +1,202 @@
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Reproduzierbarer Benchmark für Extraktion, Import und Dashboard:
+#   python benchmarks/run_benchmarks.py --sensors 20 --years 2
+# Erzeugt eine synthetische HA-Datenbank samt Backup, startet eine InfluxDB-Attrappe im
+# Speicher und führt jede Phase in einem eigenen Prozess aus, damit der Spitzen-RSS je Phase gilt.
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from fake_influx import start_fake_influx
+from synthetic_ha import create_backup, create_database, write_sensor_file
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux liefert KiB, macOS Bytes
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def dashboard_routes(year):
+    return [
+        ("index", f"/?year={year}"),
+        ("api_year", f"/api/v1/year/{year}"),
+        ("api_month", f"/api/v1/month/{year}/3"),
+        ("api_day", f"/api/v1/day/{year}/3/31"),
+        ("api_total_year", f"/api/v1/total/year/{year}"),
+        ("api_total_month", f"/api/v1/total/month/{year}/10"),
+    ]
+
+def run_phase(args):
+    # Läuft im Kindprozess; HADB_CONFIG zeigt auf die Benchmark-Konfiguration
+    result = {}
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.phase == "extract":
+            from extract_latest_ha_db import extract_latest_ha_db
+            started = time.perf_counter()
+            if not extract_latest_ha_db():
+                raise SystemExit("Extraktion fehlgeschlagen")
+            result["seconds"] = round(time.perf_counter() - started, 3)
+
+        elif args.phase == "import":
+            import ha_to_influx
+            started = time.perf_counter()
+            if ha_to_influx.main(["--force", "--refresh-watermarks", "--workers", str(args.workers)]):
+                raise SystemExit("Import fehlgeschlagen")
+            result["seconds"] = round(time.perf_counter() - started, 3)
+
+        elif args.phase == "routes":
+            started = time.perf_counter()
+            import energy_dashboard
+            result["startup_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            client = energy_dashboard.app.test_client()
+            for name, url in dashboard_routes(args.year):
+                timings = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    if response.status_code != 200:
+                        raise SystemExit(f"{url}: HTTP {response.status_code}")
+                result[name] = {
+                    "url": url,
+                    "first_ms": round(timings[0], 2),
+                    "p50_ms": round(float(np.percentile(timings, 50)), 2),
+                    "p95_ms": round(float(np.percentile(timings, 95)), 2),
+                }
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result))
+
+def spawn_phase(phase, config_path, args, extra=()):
+    env = dict(os.environ, HADB_CONFIG=str(config_path))
+    proc = subprocess.run([sys.executable, __file__, "--phase", phase, *extra], cwd=REPO_DIR, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"Phase {phase} fehlgeschlagen (Rückgabewert {proc.returncode})")
+    if args.verbose:
+        sys.stderr.write(proc.stderr)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def write_config(workdir, influx_port, args):
+    with open(REPO_DIR / "config.json", "r") as f:
+        config = json.load(f)
+    sqlite_dir = workdir / "SQLite"
+    config.update({
+        "backup_dir_windows": str(workdir / "backups"),
+        "backup_dir_linux": str(workdir / "backups"),
+        "sqlite_dir": str(sqlite_dir),
+        "sensor_file": str(workdir / "sensorliste.txt"),
+        "energy_index_dir": str(sqlite_dir / "energy_index"),
+    })
+    config["influxdb"] = dict(config.get("influxdb", {}), host="127.0.0.1", port=influx_port, database="hadb")
+    config["cache"] = {
+        "file": str(sqlite_dir / "dashboard_cache.db"),
+        # Ohne --warm-cache misst jeder Aufruf den vollständigen Weg bis zur InfluxDB
+        "max_entries": 256 if args.warm_cache else 0,
+        "persistent": args.warm_cache,
+    }
+    config["import"] = dict(config.get("import", {}), source="backup", workers=args.workers,
+                            state_file=str(sqlite_dir / "import_state.json"), short_term=args.short_term,
+                            sensor_types_file=str(sqlite_dir / "sensor_types.json"),
+                            schedule_minutes=0, log_file=str(workdir / "import.log"))
+    config["storage"] = {"backend": args.backend, "path": str(sqlite_dir / "hourly_store")}
+    config_path = workdir / "config.json"
+    with open(config_path, "w") as f:
+        json.dump(config, f, indent=2)
+    return config_path
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark für Extraktion, Import und Dashboard-Routen.")
+    parser.add_argument("--sensors", type=int, default=20, help="Anzahl synthetischer Sensoren")
+    parser.add_argument("--years", type=float, default=2, help="Jahre stündlicher Statistiken je Sensor")
+    parser.add_argument("--short-term-days", type=int, default=10, help="Tage mit 5-Minuten-Werten")
+    parser.add_argument("--filler-mb", type=int, default=20, help="Größe des Add-on-Füllarchivs im Backup")
+    parser.add_argument("--workers", type=int, default=4, help="Import-Worker")
+    parser.add_argument("--short-term", action="store_true", help="5-Minuten-Werte mit importieren")
+    parser.add_argument("--repeat", type=int, default=20, help="Aufrufe je Dashboard-Route")
+    parser.add_argument("--backend", choices=("influxdb", "local"), default="influxdb",
+                        help="Speicher-Backend für Import und Dashboard")
+    parser.add_argument("--warm-cache", action="store_true", help="Dashboard-Cache eingeschaltet lassen")
+    parser.add_argument("--workdir", type=Path, default=None, help="Arbeitsverzeichnis (Standard: temporär)")
+    parser.add_argument("--json", type=Path, default=None, help="Ergebnisse zusätzlich als JSON speichern")
+    parser.add_argument("--verbose", action="store_true", help="Ausgabe der Phasen anzeigen")
+    parser.add_argument("--phase", choices=("extract", "import", "routes"), help=argparse.SUPPRESS)
+    parser.add_argument("--year", type=int, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.phase:
+        run_phase(args)
+        return
+
+    with contextlib.ExitStack() as stack:
+        workdir = args.workdir or Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="hadb-bench-")))
+        (workdir / "backups").mkdir(parents=True, exist_ok=True)
+        (workdir / "SQLite").mkdir(exist_ok=True)
+
+        started = time.perf_counter()
+        source_db = workdir / "source.db"
+        sensor_defs, rows = create_database(source_db, sensors=args.sensors, years=args.years,
+                                            short_term_days=args.short_term_days)
+        write_sensor_file(workdir / "sensorliste.txt", sensor_defs)
+        backup = create_backup(source_db, workdir / "backups" / "bench_backup.tar", filler_mb=args.filler_mb)
+        source_db.unlink()
+        print(f"Testdaten: {args.sensors} Sensoren, {rows} Stundenwerte, Backup {backup.stat().st_size / 1e6:.1f} MB "
+              f"({time.perf_counter() - started:.1f} s)")
+
+        server = start_fake_influx()
+        stack.callback(server.shutdown)
+        config_path = write_config(workdir, server.server_address[1], args)
+        year = datetime.now().year - 1
+
+        results = {"sensors": args.sensors, "hourly_rows": rows, "workers": args.workers, "backend": args.backend}
+        results["extract"] = spawn_phase("extract", config_path, args)
+        print(f"Extraktion:  {results['extract']['seconds']:.2f} s, Spitzen-RSS {results['extract']['peak_rss_mb']} MB")
+
+        results["import"] = spawn_phase("import", config_path, args)
+        seconds = results["import"]["seconds"]
+        results["import"]["source_rows_per_second"] = round(rows / max(seconds, 1e-6))
+        written = ""
+        if args.backend == "influxdb":
+            # Gezählt von der InfluxDB-Attrappe; der lokale Speicher schreibt an ihr vorbei
+            lines = server.influx.lines_written
+            results["import"].update({"lines_written": lines, "lines_per_second": round(lines / max(seconds, 1e-6))})
+            written = f"{lines} Werte geschrieben ({lines / max(seconds, 1e-6):.0f}/s), "
+        print(f"Import:      {seconds:.2f} s, {rows / max(seconds, 1e-6):.0f} Zeilen/s aus SQLite, "
+              f"{written}Spitzen-RSS {results['import']['peak_rss_mb']} MB")
+
+        results["routes"] = spawn_phase("routes", config_path, args,
+                                        extra=("--year", str(year), "--repeat", str(args.repeat)))
+        print(f"Dashboard ({args.repeat} Aufrufe je Route, Backend {args.backend}, Cache {'an' if args.warm_cache else 'aus'}, "
+              f"Spitzen-RSS {results['routes'].pop('peak_rss_mb')} MB, "
+              f"Start {results['routes'].pop('startup_ms'):.0f} ms):")
+        for name, timing in results["routes"].items():
+            print(f"  {name:<16} erster {timing['first_ms']:8.2f} ms   p50 {timing['p50_ms']:8.2f} ms   "
+                  f"p95 {timing['p95_ms']:8.2f} ms   {timing['url']}")
+
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
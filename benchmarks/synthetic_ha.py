@@ -0,0 +1,133 @@
+import io
+import json
+import os
+import sqlite3
+import tarfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+# Erzeugt eine home-assistant_v2.db mit stündlichen Statistiken (statistics) und
+# 5-Minuten-Werten (statistics_short_term) sowie ein Backup im Format eines HA Full Backups.
+# Die Sensoren wechseln zwischen Zählern (state ≈ sum) und Verbrauchswerten pro Stunde (delta),
+# passend zu detect_sensor_type in sensor_types.py.
+
+SCHEMA = """
+CREATE TABLE statistics_meta (
+    id INTEGER PRIMARY KEY,
+    statistic_id VARCHAR(255),
+    source VARCHAR(32),
+    unit_of_measurement VARCHAR(255),
+    has_mean BOOLEAN,
+    has_sum BOOLEAN,
+    name VARCHAR(255)
+);
+CREATE UNIQUE INDEX ix_statistics_meta_statistic_id ON statistics_meta (statistic_id);
+CREATE TABLE statistics (
+    id INTEGER PRIMARY KEY,
+    created_ts FLOAT,
+    metadata_id INTEGER,
+    start_ts FLOAT,
+    mean FLOAT,
+    min FLOAT,
+    max FLOAT,
+    last_reset_ts FLOAT,
+    state FLOAT,
+    sum FLOAT
+);
+CREATE UNIQUE INDEX ix_statistics_statistic_id_start_ts ON statistics (metadata_id, start_ts);
+CREATE TABLE statistics_short_term (
+    id INTEGER PRIMARY KEY,
+    created_ts FLOAT,
+    metadata_id INTEGER,
+    start_ts FLOAT,
+    mean FLOAT,
+    min FLOAT,
+    max FLOAT,
+    last_reset_ts FLOAT,
+    state FLOAT,
+    sum FLOAT
+);
+CREATE UNIQUE INDEX ix_statistics_short_term_statistic_id_start_ts ON statistics_short_term (metadata_id, start_ts);
+"""
+
+def sensor_list(count):
+    # (statistic_id, friendly_name, sensor_type); Namen mit Leerzeichen prüfen das Escaping
+    return [
+        (f"sensor.bench_{i:03d}_energy", f"Bench Gerät {i:03d}", "counter" if i % 2 == 0 else "delta")
+        for i in range(count)
+    ]
+
+def hourly_consumption(rng, hours):
+    # Tagesprofil mit Rauschen, nie negativ
+    hour_of_day = np.arange(hours) % 24
+    profile = 0.2 + 0.3 * np.sin((hour_of_day - 6) / 24 * 2 * np.pi).clip(min=0)
+    return (profile * rng.uniform(0.5, 1.5, hours)).round(4)
+
+def sensor_rows(metadata_id, sensor_type, start_ts, step, consumption):
+    total = np.cumsum(consumption)
+    if sensor_type == "counter":
+        state, sums = total, total
+    else:
+        state, sums = consumption, total
+    starts = start_ts + step * np.arange(len(consumption))
+    created = starts + step + 10
+    return zip(created.tolist(), [metadata_id] * len(consumption), starts.tolist(), state.tolist(), sums.tolist())
+
+def create_database(db_path, sensors=20, years=2, short_term_days=10, end=None, seed=42):
+    db_path = Path(db_path)
+    db_path.unlink(missing_ok=True)
+    end = end or datetime(datetime.now().year, 1, 1, tzinfo=timezone.utc)
+    end_ts = int(end.timestamp())
+    hours = int(years * 365.25 * 24)
+    start_ts = end_ts - hours * 3600
+    rng = np.random.default_rng(seed)
+
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    sensor_defs = sensor_list(sensors)
+    rows = 0
+    for metadata_id, (statistic_id, friendly_name, sensor_type) in enumerate(sensor_defs, start=1):
+        conn.execute("INSERT INTO statistics_meta VALUES (?, ?, 'recorder', 'kWh', 0, 1, ?)",
+                     (metadata_id, statistic_id, friendly_name))
+        consumption = hourly_consumption(rng, hours)
+        conn.executemany(
+            "INSERT INTO statistics (created_ts, metadata_id, start_ts, state, sum) VALUES (?, ?, ?, ?, ?)",
+            sensor_rows(metadata_id, sensor_type, start_ts, 3600, consumption))
+        rows += hours
+        if short_term_days:
+            slots = short_term_days * 24 * 12
+            short_consumption = (np.repeat(consumption[-short_term_days * 24:], 12) / 12).round(5)
+            conn.executemany(
+                "INSERT INTO statistics_short_term (created_ts, metadata_id, start_ts, state, sum) VALUES (?, ?, ?, ?, ?)",
+                sensor_rows(metadata_id, sensor_type, end_ts - slots * 300, 300, short_consumption))
+    conn.commit()
+    conn.close()
+    return sensor_defs, rows
+
+def write_sensor_file(path, sensor_defs):
+    with open(path, "w") as f:
+        for statistic_id, friendly_name, _ in sensor_defs:
+            f.write(f"{statistic_id};{friendly_name}\n")
+
+def add_bytes(archive, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    archive.addfile(info, io.BytesIO(data))
+
+def create_backup(db_path, backup_path, filler_mb=20):
+    # Äußeres .tar mit backup.json, Add-on-Archiv als Füllmaterial und homeassistant.tar.gz,
+    # darin die Datenbank unter data/ wie in einem echten Full Backup
+    backup_path = Path(backup_path)
+    inner_path = backup_path.with_suffix(".inner.tar.gz")
+    with tarfile.open(inner_path, "w:gz") as inner:
+        add_bytes(inner, "data/configuration.yaml", b"homeassistant:\n")
+        inner.add(db_path, arcname="data/home-assistant_v2.db")
+    with tarfile.open(backup_path, "w") as outer:
+        add_bytes(outer, "./backup.json", json.dumps({"slug": backup_path.stem, "type": "full"}).encode())
+        if filler_mb:
+            add_bytes(outer, "./addon_bench.tar.gz", os.urandom(filler_mb * 1024 * 1024))
+        outer.add(inner_path, arcname="./homeassistant.tar.gz")
+    inner_path.unlink()
+    return backup_path
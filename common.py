@@ -0,0 +1,37 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+# Gemeinsame Helfer für Import, Dashboard und Werkzeuge: Pfad der Konfiguration,
+# atomares Speichern von JSON-Dateien und Umrechnung von UTC-Zeitangaben.
+
+# Alternative Konfiguration (z. B. für die Benchmarks) über die Umgebungsvariable HADB_CONFIG
+CONFIG_PATH = Path(os.environ.get("HADB_CONFIG", Path(__file__).parent / "config.json"))
+
+def load_config():
+    with open(CONFIG_PATH, "r") as f:
+        return json.load(f)
+
+def save_json(path, data):
+    # Erst in eine temporäre Datei schreiben und dann tauschen, damit kein Leser eine halbe Datei sieht
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_name(path.name + ".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_file, path)
+
+def parse_utc_datetime(value):
+    # fromisoformat kennt das Suffix "Z" erst ab Python 3.11
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+def parse_utc(value):
+    return int(parse_utc_datetime(value).timestamp())
+
+def to_epoch(value):
+    if isinstance(value, str):
+        return parse_utc(value)
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return int(value)
@@ -1,11 +1,6 @@
 
 from influxdb import InfluxDBClient
-import json
-from pathlib import Path
-
-def load_config():
-    with open(Path(__file__).parent / "config.json", "r") as f:
-        return json.load(f)
+from common import load_config
 
 config = load_config()
 client = InfluxDBClient(host=config["influxdb"]["host"], port=config["influxdb"]["port"])
@@ -0,0 +1,163 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from common import to_epoch
+
+# Abgeschlossene Zeiträume ändern sich nach dem Import nicht mehr. Die fertig
+# aufbereiteten Chart-Daten werden deshalb im Prozess (LRU) und optional in einer
+# SQLite-Datei zwischengespeichert. Der Import trägt die geänderten Zeitbereiche
+# in dieselbe Datei ein, damit jeder Dashboard-Prozess betroffene Einträge verwirft.
+
+# Invalidierungen älter als diese Anzahl Tage werden beim nächsten Import gelöscht
+INVALIDATION_RETENTION_DAYS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    start_ts INTEGER NOT NULL,
+    end_ts INTEGER NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS invalidations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    start_ts INTEGER NOT NULL,
+    end_ts INTEGER NOT NULL,
+    created INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS invalidations_range ON invalidations (start_ts, end_ts);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('created', CAST(strftime('%s', 'now') AS TEXT));
+"""
+
+def _connect(cache_file):
+    # Mit Anlegen des Schemas; nur beim Öffnen des Caches und beim Schreiben durch den Import
+    Path(cache_file).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(cache_file, timeout=10)
+    conn.executescript(SCHEMA)
+    return conn
+
+def invalidate_range(cache_file, start, end, retention_days=INVALIDATION_RETENTION_DAYS):
+    start_ts, end_ts = to_epoch(start), to_epoch(end)
+    now = int(time.time())
+    conn = _connect(cache_file)
+    with conn:
+        conn.execute(
+            "INSERT INTO invalidations (start_ts, end_ts, created) VALUES (?, ?, ?)",
+            (start_ts, end_ts, now))
+        conn.execute(
+            "DELETE FROM entries WHERE start_ts <= ? AND end_ts > ?", (end_ts, start_ts))
+        # Alte Invalidierungen löschen. Ihr jüngster Zeitpunkt wird zum Stand ohne passenden Import,
+        # damit Last-Modified für die betroffenen Zeiträume nicht zurückspringt.
+        cutoff = now - retention_days * 86400
+        pruned = conn.execute("SELECT max(created) FROM invalidations WHERE created < ?", (cutoff,)).fetchone()[0]
+        if pruned is not None:
+            conn.execute("UPDATE meta SET value = CAST(max(CAST(value AS INTEGER), ?) AS TEXT) WHERE key = 'created'",
+                         (pruned,))
+            conn.execute("DELETE FROM invalidations WHERE created < ?", (cutoff,))
+    conn.close()
+
+class DashboardCache:
+    def __init__(self, cache_file, max_entries=256, persistent=True):
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.persistent = persistent
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        conn = _connect(cache_file)
+        row = conn.execute("SELECT coalesce(max(id), 0) FROM invalidations").fetchone()
+        conn.close()
+        self._last_invalidation = row[0]
+
+    def _conn(self):
+        # Eine Verbindung je Thread, offen für die Lebensdauer des Threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.cache_file, timeout=10)
+            self._local.conn = conn
+        return conn
+
+    def _apply_invalidations(self, conn):
+        rows = conn.execute(
+            "SELECT id, start_ts, end_ts FROM invalidations WHERE id > ? ORDER BY id",
+            (self._last_invalidation,)).fetchall()
+        if rows and rows[0][0] > self._last_invalidation + 1:
+            # Dazwischen liegende Invalidierungen sind bereits gelöscht; was betroffen war, ist unbekannt
+            self._entries.clear()
+        for inv_id, start_ts, end_ts in rows:
+            for key, (entry_start, entry_end, _) in list(self._entries.items()):
+                if entry_start <= end_ts and start_ts < entry_end:
+                    del self._entries[key]
+            self._last_invalidation = inv_id
+
+    def get(self, key):
+        with self._lock:
+            conn = self._conn()
+            self._apply_invalidations(conn)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][2]
+            if not self.persistent:
+                return None
+            row = conn.execute(
+                "SELECT start_ts, end_ts, payload FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            data = json.loads(row[2])
+            self._store(key, row[0], row[1], data)
+            return data
+
+    def last_modified(self, start, end):
+        # Daten eines Zeitraums ändern sich nur durch Importe; ohne passenden Import gilt die Anlage der Datei
+        start_ts, end_ts = to_epoch(start), to_epoch(end)
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT max(created) FROM invalidations WHERE start_ts <= ? AND end_ts > ?",
+            (end_ts, start_ts)).fetchone()
+        if row[0] is not None:
+            return row[0]
+        return int(conn.execute("SELECT value FROM meta WHERE key = 'created'").fetchone()[0])
+
+    def latest_invalidation(self):
+        return self._conn().execute("SELECT coalesce(max(id), 0) FROM invalidations").fetchone()[0]
+
+    def generation(self):
+        return self._last_invalidation
+
+    def put(self, key, start, end, data, generation=None):
+        start_ts, end_ts = to_epoch(start), to_epoch(end)
+        # Nur abgeschlossene Zeiträume cachen, der laufende Tag/Monat/Jahr kommt immer aus Influx
+        if end_ts > time.time():
+            return
+        with self._lock:
+            conn = self._conn()
+            if generation is not None:
+                # Während der Berechnung importierte Daten machen das Ergebnis ungültig
+                stale = conn.execute(
+                    "SELECT 1 FROM invalidations WHERE id > ? AND start_ts <= ? AND end_ts > ?",
+                    (generation, end_ts, start_ts)).fetchone()
+                if stale:
+                    return
+            self._store(key, start_ts, end_ts, data)
+            if self.persistent:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO entries (key, start_ts, end_ts, payload) VALUES (?, ?, ?, ?)",
+                        (key, start_ts, end_ts, json.dumps(data)))
+                    # Die Datei hält höchstens max_entries Einträge; die ältesten Einträge fallen heraus
+                    conn.execute(
+                        "DELETE FROM entries WHERE rowid NOT IN (SELECT rowid FROM entries ORDER BY rowid DESC LIMIT ?)",
+                        (self.max_entries,))
+
+    def _store(self, key, start_ts, end_ts, data):
+        self._entries[key] = (start_ts, end_ts, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
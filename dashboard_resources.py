@@ -0,0 +1,137 @@
+import json
+import threading
+import time
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+
+from common import CONFIG_PATH
+from dashboard_cache import DashboardCache
+from energy_index import EnergyIndex
+from instrumentation import span
+from sensor_types import DEFAULT_TYPES_FILE, load_sensor_types, types_by_friendly_name
+from storage import InfluxBackend, LocalStoreBackend, backend_name
+
+# Gemeinsame Ressourcen des Dashboards: Konfiguration, Speicher-Backend, Cache und
+# Sensorkatalog werden einmal pro Prozess angelegt und von allen Requests/Threads genutzt.
+
+_lock = threading.RLock()
+_config = None
+_config_mtime = None
+_influx_client = None
+_influx_settings = None
+_dashboard_cache = None
+_local_store = None
+_energy_index = None
+_catalog = None
+_catalog_loaded = 0.0
+_catalog_invalidation = None
+
+def get_config():
+    global _config, _config_mtime
+    mtime = CONFIG_PATH.stat().st_mtime
+    if _config is None or mtime != _config_mtime:
+        with _lock:
+            with open(CONFIG_PATH, "r") as f:
+                _config = json.load(f)
+            _config_mtime = mtime
+    return _config
+
+def get_local_zone():
+    # Folgt timezone in config.json ohne Neustart; ZoneInfo hält die Zonen selbst im Cache
+    return ZoneInfo(get_config().get("timezone", "Europe/Berlin"))
+
+def get_influx_client():
+    # Ein Client mit Keep-Alive-Verbindungspool; neu angelegt nur, wenn sich die Einstellungen ändern
+    global _influx_client, _influx_settings
+    config = get_config()
+    settings = config["influxdb"]
+    with _lock:
+        if _influx_client is None or settings != _influx_settings:
+            # Erst hier laden: mit dem lokalen Speicher wird influxdb/pandas nie importiert
+            from instrumented_influx import InstrumentedInfluxDBClient
+            if _influx_client is not None:
+                _influx_client.close()
+            _influx_client = InstrumentedInfluxDBClient(
+                host=settings["host"],
+                port=settings["port"],
+                database=settings["database"],
+                pool_size=settings.get("pool_size", 10)
+            )
+            _influx_settings = dict(settings)
+        # Umschalten ohne Neustart: jede Abfrage mit Dauer und Zeilenzahl ausgeben
+        _influx_client.log_queries = config.get("instrumentation", {}).get("log_queries", False)
+        return _influx_client
+
+def get_storage_backend():
+    # storage.backend = "local": memory-mapped Stundenwerte statt InfluxDB-Abfragen
+    global _local_store
+    config = get_config()
+    storage = config.get("storage", {})
+    if storage.get("backend", "influxdb") != "local":
+        return InfluxBackend(get_influx_client())
+    path = Path(__file__).parent / storage.get("path", "SQLite/hourly_store")
+    zone = config.get("timezone", "Europe/Berlin")
+    with _lock:
+        if _local_store is None or _local_store.path != path or str(_local_store.zone) != zone:
+            _local_store = LocalStoreBackend(path, zone=zone)
+        return _local_store
+
+def get_energy_index():
+    global _energy_index
+    # Je Backend ein eigener Index, da beide Speicher verschiedene Stände haben können
+    config = get_config()
+    path = Path(__file__).parent / config.get("energy_index_dir", "SQLite/energy_index") / backend_name(config)
+    with _lock:
+        if _energy_index is None or _energy_index.path != path:
+            _energy_index = EnergyIndex(path)
+        return _energy_index
+
+def get_cache():
+    global _dashboard_cache
+    with _lock:
+        if _dashboard_cache is None:
+            cache_config = get_config().get("cache", {})
+            _dashboard_cache = DashboardCache(
+                Path(__file__).parent / cache_config.get("file", "SQLite/dashboard_cache.db"),
+                max_entries=cache_config.get("max_entries", 256),
+                persistent=cache_config.get("persistent", True)
+            )
+        return _dashboard_cache
+
+def read_sensor_names():
+    sensor_file = Path(__file__).parent / get_config()["sensor_file"]
+    names = {}
+    try:
+        with open(sensor_file, "r") as f:
+            for line in f:
+                if ';' in line:
+                    sensor_id, friendly_name = line.strip().split(';')
+                    names[friendly_name.strip()] = sensor_id.strip()
+    except OSError:
+        pass
+    return names
+
+def get_sensor_catalog():
+    # entity_id -> {"sensor_type", "sensor_id"}; neu geladen nach Ablauf der TTL oder nach einem Import
+    global _catalog, _catalog_loaded, _catalog_invalidation
+    ttl = get_config().get("catalog_ttl_seconds", 300)
+    latest_invalidation = get_cache().latest_invalidation()
+    with _lock:
+        if (_catalog is None or time.monotonic() - _catalog_loaded > ttl
+                or latest_invalidation != _catalog_invalidation):
+            with span("catalog"):
+                sensor_ids = read_sensor_names()
+                # Alle Sensoren im Speicher (SHOW SERIES bzw. lokaler Katalog), auch solche, die nicht mehr
+                # in der Sensorliste stehen; für die übrigen gilt der vom Import festgehaltene Typ
+                types_file = Path(__file__).parent / get_config().get("import", {}).get(
+                    "sensor_types_file", DEFAULT_TYPES_FILE)
+                sensor_types = dict(get_storage_backend().sensor_types())
+                sensor_types.update(types_by_friendly_name(load_sensor_types(types_file)))
+                _catalog = {
+                    entity_id: {"sensor_type": sensor_type, "sensor_id": sensor_ids.get(entity_id)}
+                    for entity_id, sensor_type in sensor_types.items()
+                }
+            _catalog_loaded = time.monotonic()
+            _catalog_invalidation = latest_invalidation
+        return _catalog
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+# Spaltenweise Aggregation der Rollup-Werte: statt jeden Punkt einzeln zu parsen und in
+# verschachtelte dicts zu summieren, werden die Epoch-Zeitstempel je Sensor per
+# searchsorted den lokalen Zeitfenstern zugeordnet und mit bincount aufsummiert.
+
+MONTH_LABELS = ["Jan", "Feb", "Mär", "Apr", "Mai", "Jun", "Jul", "Aug", "Sep", "Okt", "Nov", "Dez"]
+# Nachkommastellen der kWh-Werte in den Chart-Daten (3 = Wh)
+PAYLOAD_DECIMALS = 3
+EMPTY_SERIES = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+
+def to_epoch_array(datetimes):
+    return np.array([int(dt.timestamp()) for dt in datetimes], dtype=np.int64)
+
+def month_edges(year, zone):
+    starts = [datetime(year, month, 1, tzinfo=zone) for month in range(1, 13)]
+    return to_epoch_array(starts + [datetime(year + 1, 1, 1, tzinfo=zone)])
+
+def day_edges(year, month, zone):
+    first = datetime(year, month, 1, tzinfo=zone)
+    next_month = datetime(year + (month == 12), month % 12 + 1, 1, tzinfo=zone)
+    days = (next_month.date() - first.date()).days
+    return to_epoch_array([datetime(year, month, d, tzinfo=zone) for d in range(1, days + 1)] + [next_month])
+
+def hour_edges(year, month, day, zone):
+    # Stundenfenster in UTC; an Tagen mit Zeitumstellung sind es 23 bzw. 25 Stunden
+    start = datetime(year, month, day, tzinfo=zone)
+    end = datetime.combine(start.date() + timedelta(days=1), datetime.min.time(), tzinfo=zone)
+    edges = np.arange(int(start.timestamp()), int(end.timestamp()) + 1, 3600, dtype=np.int64)
+    local_hours = np.array([datetime.fromtimestamp(ts, tz=timezone.utc).astimezone(zone).hour for ts in edges[:-1]])
+    return edges, local_hours
+
+def bucket_matrix(series_arrays, sensors, edges, columns=None, n_columns=None):
+    n_buckets = len(edges) - 1
+    if columns is None:
+        columns = np.arange(n_buckets)
+        n_columns = n_buckets
+    matrix = np.zeros((len(sensors), n_columns))
+    for row, sensor in enumerate(sensors):
+        times, values = series_arrays.get(sensor, EMPTY_SERIES)
+        values = np.round(values, 4)
+        idx = np.searchsorted(edges, times, side='right') - 1
+        valid = (idx >= 0) & (idx < n_buckets) & (values > 0)
+        matrix[row] = np.bincount(columns[idx[valid]], weights=values[valid], minlength=n_columns)
+    return matrix
+
+def series_from_matrix(sensors, matrix, decimals=PAYLOAD_DECIMALS):
+    # Spaltenformat: je Sensor nur die Zahlen, die Kategorien stehen einmal in der Antwort
+    rows = np.round(matrix, decimals)
+    order = np.argsort(rows.sum(axis=1), kind='stable')[::-1]
+    return [{'name': sensors[i], 'data': rows[i].tolist()} for i in order]
@@ -1,16 +1,74 @@
-from flask import Flask, render_template, request
-from influxdb import InfluxDBClient
-from influx_query_generator import generate_influx_query, get_sensor_type
+from flask import Flask, render_template, request, jsonify, stream_with_context
+from energy_aggregation import (MONTH_LABELS, PAYLOAD_DECIMALS, bucket_matrix, day_edges, hour_edges, month_edges,
+                                series_from_matrix)
+from response_compression import compress_response
+from energy_export import EXPORT_FORMATS, iter_export, require_pyarrow
+from common import to_epoch
+from dashboard_resources import (get_cache, get_config, get_energy_index, get_local_zone, get_sensor_catalog,
+                                 get_storage_backend, read_sensor_names)
+from storage import EXPORT_MEASUREMENTS
+from import_jobs import ImportJobRunner
+from instrumentation import current_timer, metrics, span, start_request_timer
 from datetime import datetime, timedelta, timezone
-from zoneinfo import ZoneInfo
-import json
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 from pathlib import Path
+from urllib.parse import urlencode
+from markupsafe import Markup
+import json
+import threading
+import time
+import numpy as np
 
 app = Flask(__name__)
-
-def load_config():
-    with open(Path(__file__).parent / "config.json", "r") as f:
-        return json.load(f)
+# Ändert sich das Format der Chart-Daten, werden alte Cache-Einträge und ETags damit ungültig
+PAYLOAD_FORMAT = "c2"
+query_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="storage-query")
+# influxdb/pandas im Hintergrund laden: der Worker ist sofort bereit, die erste Abfrage wartet nicht darauf
+query_executor.submit(get_storage_backend)
+# Gleichzeitig wartende Live-Verbindungen je Prozess begrenzen, damit sie nicht alle Worker-Threads belegen
+live_streams = threading.BoundedSemaphore(get_config().get("live", {}).get("max_streams", 4))
+
+import_config = get_config().get("import", {})
+import_runner = ImportJobRunner(
+    Path(__file__).parent,
+    Path(__file__).parent / import_config.get("log_file", "log_lade_sensordaten.txt"),
+    total_sensors=lambda: len(read_sensor_names()),
+    log_max_bytes=import_config.get("log_max_bytes", 1024 * 1024),
+)
+import_runner.start_schedule(import_config.get("schedule_minutes", 0))
+
+@app.before_request
+def start_timing():
+    start_request_timer().started = time.perf_counter()
+
+@app.after_request
+def add_server_timing(response):
+    timer = current_timer()
+    if timer is None:
+        return response
+    elapsed = time.perf_counter() - timer.started
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.observe("hadb_request_duration_seconds", elapsed, help="Antwortzeit der Dashboard-Routen", route=route)
+    timing = timer.server_timing()
+    response.headers["Server-Timing"] = (timing + ", " if timing else "") + f"total;dur={elapsed * 1000:.1f}"
+    return response
+
+@app.after_request
+def compress(response):
+    # Nach add_server_timing registriert, läuft also davor und zählt zur Gesamtzeit
+    settings = get_config().get("compression", {})
+    if not settings.get("enabled", True):
+        return response
+    with span("compress"):
+        return compress_response(response, request.accept_encodings, min_bytes=settings.get("min_bytes", 1024),
+                                 level=settings.get("level", 6))
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if not get_config().get("instrumentation", {}).get("metrics", False):
+        return "Metriken sind deaktiviert (instrumentation.metrics in config.json)", 404
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 def is_within_week_range(timestamp_str, start_dt, end_dt):
     try:
@@ -33,288 +91,366 @@ def is_within_year(timestamp_str, year):
     except ValueError:
         return False
 
-def get_all_sensors(influx_client):
-    query = 'SHOW TAG VALUES FROM energy WITH KEY = "entity_id"'
-    return sorted([r['value'] for r in influx_client.query(query).get_points()])
+def to_utc_string(dt):
+    return dt.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
 
 def get_month_range(year, month):
-    start = datetime(year, month, 1)
+    zone = get_local_zone()
+    start = datetime(year, month, 1, tzinfo=zone)
     if month == 12:
-        end = datetime(year + 1, 1, 1)
+        end = datetime(year + 1, 1, 1, tzinfo=zone)
     else:
-        end = datetime(year, month + 1, 1)
-    return start.isoformat() + "Z", end.isoformat() + "Z"
+        end = datetime(year, month + 1, 1, tzinfo=zone)
+    return to_utc_string(start), to_utc_string(end)
 
 def get_year_range(year):
-    start = datetime(year, 1, 1)
-    end = datetime(year + 1, 1, 1)
-    return start.isoformat() + "Z", end.isoformat() + "Z"
+    zone = get_local_zone()
+    start = datetime(year, 1, 1, tzinfo=zone)
+    end = datetime(year + 1, 1, 1, tzinfo=zone)
+    return to_utc_string(start), to_utc_string(end)
 
 def get_day_range(year, month, day):
-    start = datetime(year, month, day)
-    end = start + timedelta(days=1)
-    return start.isoformat() + "Z", end.isoformat() + "Z"
+    zone = get_local_zone()
+    start = datetime(year, month, day, tzinfo=zone)
+    end = datetime.combine(start.date() + timedelta(days=1), datetime.min.time(), tzinfo=zone)
+    return to_utc_string(start), to_utc_string(end)
 
 @app.route('/load_sensordaten')
 def load_sensordaten():
-    import subprocess
-    import pathlib
-    import sys
-    from flask import redirect, request
-
-    base_path = pathlib.Path(__file__).parent
-    log_path = base_path / "log_lade_sensordaten.txt"
-    with open(log_path, "w", encoding="utf-8") as log_file:
-        proc = subprocess.run([sys.executable, "ha_to_influx.py"], cwd=base_path, capture_output=True, text=True)
-        log_file.write("=== ha_to_influx.py ===\n")
-        log_file.write(proc.stdout + "\n" + proc.stderr + "\n")
+    from flask import redirect
 
+    # Import nur anstoßen; läuft bereits einer, wird dieser Aufruf mit ihm zusammengefasst
+    import_runner.trigger("manual")
     return redirect(request.args.get("redirect", "/"))
 
-@app.route('/')
-def index():
-    from collections import defaultdict
-    month_labels = {
-        "01": "Jan", "02": "Feb", "03": "Mär", "04": "Apr", "05": "Mai",
-        "06": "Jun", "07": "Jul", "08": "Aug", "09": "Sep", "10": "Okt",
-        "11": "Nov", "12": "Dez"
+@app.route('/import/status')
+def import_status():
+    return jsonify(import_runner.status())
+
+def get_cached(key, start, end, build):
+    cache = get_cache()
+    with span("cache"):
+        data = cache.get(key)
+    metrics.inc("hadb_cache_requests_total", help="Zugriffe auf den Ergebnis-Cache",
+                result="miss" if data is None else "hit")
+    if data is None:
+        generation = cache.generation()
+        data = build()
+        with span("cache"):
+            cache.put(key, start, end, data, generation=generation)
+    return data
+
+def fetch_view_inputs(resolution, start, end, query="rollup_arrays"):
+    # Sensorliste und Messwerte gleichzeitig abfragen; die Seite wartet nur auf die langsamere Abfrage
+    # copy_context: die Spans der Worker-Threads landen im Timer des aktuellen Requests
+    sensor_future = query_executor.submit(copy_context().run, get_sensor_catalog)
+    series_future = query_executor.submit(copy_context().run, getattr(get_storage_backend(), query),
+                                          resolution, start, end)
+    return sorted(sensor_future.result()), series_future.result()
+
+def build_year_data(year, start, end):
+    sensors, series_arrays = fetch_view_inputs("1mo", start, end)
+
+    with span("aggregate"):
+        matrix = bucket_matrix(series_arrays, sensors, month_edges(year, get_local_zone()))
+        # Nur Monate anzeigen, für die überhaupt Verbrauch vorliegt
+        months = np.flatnonzero(matrix.sum(axis=0) > 0)
+        matrix = matrix[:, months]
+        categories = [MONTH_LABELS[m] for m in months]
+        series = series_from_matrix(sensors, matrix)
+
+    with span("serialize"):
+        body = json.dumps({"categories": categories, "series": series, "total_kwh": round(float(matrix.sum()), 2)},
+                          separators=(",", ":"))
+    return {"body": body}
+
+def build_month_data(year, month, start, end):
+    sensors, series_arrays = fetch_view_inputs("1d", start, end)
+
+    with span("aggregate"):
+        edges = day_edges(year, month, get_local_zone())
+        matrix = bucket_matrix(series_arrays, sensors, edges, columns=np.arange(len(edges) - 1), n_columns=31)
+        all_days = [f"{i:02d}" for i in range(1, 32)]
+        series = series_from_matrix(sensors, matrix)
+
+    with span("serialize"):
+        body = json.dumps({"categories": all_days, "series": series, "total_kwh": round(float(matrix.sum()), 2)},
+                          separators=(",", ":"))
+    return {"body": body}
+
+def build_day_data(year, month, day, start, end):
+    sensors, series_arrays = fetch_view_inputs("1h", start, end)
+
+    # An Tagen mit Zeitumstellung fallen zwei Stundenwerte auf dieselbe lokale Stunde
+    with span("aggregate"):
+        edges, local_hours = hour_edges(year, month, day, get_local_zone())
+        matrix = bucket_matrix(series_arrays, sensors, edges, columns=local_hours, n_columns=24)
+        all_hours = [f"{i:02d}" for i in range(24)]
+        series = series_from_matrix(sensors, matrix)
+
+    with span("serialize"):
+        # latest: Beginn der jüngsten Stunde mit Werten, Ausgangspunkt für /stream
+        body = json.dumps({"categories": all_hours, "series": series, "total_kwh": round(float(matrix.sum()), 2),
+                           "latest": latest_hour(series_arrays, edges)}, separators=(",", ":"))
+    return {"body": body}
+
+def latest_hour(series_arrays, edges):
+    latest = [int(times[(times >= edges[0]) & (times < edges[-1])].max())
+              for times, _ in series_arrays.values() if ((times >= edges[0]) & (times < edges[-1])).any()]
+    return max(latest) if latest else None
+
+def build_day_update(year, month, day, since_ts, end):
+    # Nur die Stunden ab since_ts (die jüngste bekannte Stunde kann sich noch ändern) neu abfragen.
+    # Am Tag der Zeitumstellung gehören zwei UTC-Stunden zur selben lokalen Stunde; beide werden gelesen.
+    edges, local_hours = hour_edges(year, month, day, get_local_zone())
+    position = min(max(int(np.searchsorted(edges, since_ts, side="right")) - 1, 0), len(local_hours) - 1)
+    query_from = int(edges[:-1][local_hours == local_hours[position]].min())
+    sensors, series_arrays = fetch_view_inputs("1h", to_utc_string(datetime.fromtimestamp(query_from, tz=timezone.utc)),
+                                               end)
+    latest = latest_hour(series_arrays, edges)
+    if latest is None:
+        return None
+    columns = np.unique(local_hours[edges[:-1] >= query_from])
+    matrix = bucket_matrix(series_arrays, sensors, edges, columns=local_hours, n_columns=24)[:, columns]
+    rows = np.round(matrix, PAYLOAD_DECIMALS)
+    return {
+        "columns": columns.tolist(),
+        "series": [{"name": sensor, "data": rows[i].tolist()} for i, sensor in enumerate(sensors) if rows[i].any()],
+        "latest": latest,
     }
 
+def totals_body(sorted_data, totals):
+    # Eine Reihe, die Sensoren sind die Kategorien
+    with span("serialize"):
+        return json.dumps({
+            "categories": [sensor for sensor, _ in sorted_data],
+            "series": [{"name": "Gesamtverbrauch", "data": [round(val, PAYLOAD_DECIMALS) for _, val in sorted_data]}],
+            "total_kwh": round(sum(totals.values()), 2),
+        }, separators=(",", ":"))
+
+def build_total_data(resolution, start, end):
+    sensors, totals = fetch_view_inputs(resolution, start, end, query="rollup_totals")
+
+    with span("aggregate"):
+        totals = {sensor: totals[sensor] for sensor in sensors if totals.get(sensor, 0) > 0}
+        sorted_data = sorted(totals.items(), key=lambda x: x[1], reverse=True)
+    return {"body": totals_body(sorted_data, totals)}
+
+def build_range_data(start, end):
+    # Zwei Zugriffe je Sensor auf den kumulierten Index; ohne Index wie bisher über die Stundenwerte
+    with span("index"):
+        index_totals = get_energy_index().range_totals(to_epoch(start), to_epoch(end))
+    if not index_totals:
+        return build_total_data("1h", start, end)
+    sensors = sorted(get_sensor_catalog())
+
+    with span("aggregate"):
+        totals = {sensor: index_totals[sensor] for sensor in sensors if (index_totals.get(sensor) or 0) > 0}
+        sorted_data = sorted(totals.items(), key=lambda x: x[1], reverse=True)
+    return {"body": totals_body(sorted_data, totals)}
+
+def parse_range_args(args):
+    # from/to als Datum oder Datum mit Uhrzeit in lokaler Zeit; ein reines Datum bei "to" zählt ganz mit
+    try:
+        start = datetime.fromisoformat(args["from"])
+        end = datetime.fromisoformat(args["to"])
+    except (KeyError, ValueError):
+        return None
+    if len(args["to"]) == 10:
+        end = datetime.combine(end.date() + timedelta(days=1), datetime.min.time())
+    zone = get_local_zone()
+    start, end = start.replace(tzinfo=zone), end.replace(tzinfo=zone)
+    if end <= start:
+        return None
+    return to_utc_string(start), to_utc_string(end)
+
+def get_total_period(view_type, year, month, day):
+    if view_type == "year":
+        start, end = get_year_range(year)
+        return start, end, "1mo", f"Jahresverbrauch {year}", f"/?year={year}"
+    if view_type == "month" and month:
+        start, end = get_month_range(year, month)
+        return start, end, "1d", f"Monatsverbrauch {year}-{month:02d}", f"/{year}/{month:02d}"
+    if view_type == "day" and month and day:
+        start, end = get_day_range(year, month, day)
+        return start, end, "1h", f"Tagesverbrauch {year}-{month:02d}-{day:02d}", f"/{year}/{month:02d}/{day:02d}"
+    return None
+
+def api_response(key, start, end, build):
+    # ETag/Last-Modified hängen nur am letzten Import, der den Zeitraum betroffen hat.
+    # Schwaches ETag, da dieselbe Antwort je nach Accept-Encoding komprimiert ausgeliefert wird.
+    # Die Zeitzone gehört zum Schlüssel, da sich timezone ohne Neustart ändern kann
+    key = f"{PAYLOAD_FORMAT}:{get_local_zone()}:{key}"
+    last_modified = get_cache().last_modified(start, end)
+    etag = f"{key}-{last_modified}"
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        data = get_cached(key, start, end, build)
+        with span("response"):
+            # Der fertige JSON-Text aus dem Cache wird unverändert ausgeliefert
+            response = app.response_class(data["body"], mimetype="application/json")
+    response.set_etag(etag, weak=True)
+    response.last_modified = datetime.fromtimestamp(last_modified, tz=timezone.utc)
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/v1/year/<int:year>')
+def api_year(year):
+    start, end = get_year_range(year)
+    return api_response(f"year:{year}", start, end, lambda: build_year_data(year, start, end))
+
+@app.route('/api/v1/month/<int:year>/<int:month>')
+def api_month(year, month):
+    start, end = get_month_range(year, month)
+    return api_response(f"month:{year}-{month:02d}", start, end, lambda: build_month_data(year, month, start, end))
+
+@app.route('/api/v1/day/<int:year>/<int:month>/<int:day>')
+def api_day(year, month, day):
+    start, end = get_day_range(year, month, day)
+    return api_response(f"day:{year}-{month:02d}-{day:02d}", start, end,
+                        lambda: build_day_data(year, month, day, start, end))
+
+@app.route('/api/v1/day/<int:year>/<int:month>/<int:day>/stream')
+def api_day_stream(year, month, day):
+    # Server-Sent Events für den laufenden Tag als kurzes Long-Polling: die Antwort wartet höchstens
+    # live.wait_seconds auf einen Import (neue Invalidierung im Cache), sendet dann nur die Stunden ab der
+    # zuletzt bekannten und endet. Der Browser verbindet sich nach live.poll_seconds mit der Event-ID neu,
+    # ein Worker bleibt so nie länger als wait_seconds belegt.
+    start, end = get_day_range(year, month, day)
+    # Event-ID "<jüngste Stunde>.<Invalidierung>"; ohne bekannte Invalidierung wird einmal sofort abgefragt
+    since, _, known = (request.headers.get("Last-Event-ID") or request.args.get("since", "")).partition(".")
+    since_ts = int(since) if since.isdigit() else to_epoch(start)
+    generation = int(known) if known.isdigit() else None
+    end_ts = to_epoch(end)
+    live_config = get_config().get("live", {})
+    retry_ms = int(live_config.get("poll_seconds", 15) * 1000)
+    deadline = time.monotonic() + live_config.get("wait_seconds", 25)
+
+    def events():
+        nonlocal since_ts, generation
+        yield f"retry: {retry_ms}\n\n"
+        if not live_streams.acquire(blocking=False):
+            # Alle Plätze belegt: sofort enden, der Browser versucht es nach retry erneut
+            return
+        try:
+            while time.time() <= end_ts + 3600:
+                current = get_cache().latest_invalidation()
+                if current != generation:
+                    generation = current
+                    update = build_day_update(year, month, day, since_ts, end)
+                    if update:
+                        since_ts = update["latest"]
+                        yield (f"id: {since_ts}.{generation}\nevent: buckets\n"
+                               f"data: {json.dumps(update, separators=(',', ':'))}\n\n")
+                        return
+                if time.monotonic() >= deadline:
+                    # Nur die Event-ID setzen, damit die nächste Verbindung erst auf einen neuen Import wartet
+                    yield f"id: {since_ts}.{generation}\n\n"
+                    return
+                time.sleep(1)
+            # Tag vorbei: der Client beendet die Verbindung
+            yield "event: end\ndata: {}\n\n"
+        finally:
+            live_streams.release()
+
+    return app.response_class(stream_with_context(events()), mimetype="text/event-stream",
+                              headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/api/v1/total/range')
+def api_total_range():
+    period = parse_range_args(request.args)
+    if period is None:
+        return jsonify({"error": "Ungültige Parameter (from/to im Format JJJJ-MM-TT)"}), 400
+    start, end = period
+    return api_response(f"range:{start}:{end}", start, end, lambda: build_range_data(start, end))
+
+@app.route('/api/v1/total/<string:view_type>/<int:year>', defaults={'month': None, 'day': None})
+@app.route('/api/v1/total/<string:view_type>/<int:year>/<int:month>', defaults={'day': None})
+@app.route('/api/v1/total/<string:view_type>/<int:year>/<int:month>/<int:day>')
+def api_total(view_type, year, month, day):
+    period = get_total_period(view_type, year, month, day)
+    if period is None:
+        return jsonify({"error": "Ungültige Parameter"}), 400
+    start, end, resolution, _, _ = period
+    return api_response(f"total:{view_type}:{start}", start, end, lambda: build_total_data(resolution, start, end))
+
+@app.route('/export')
+def export():
+    # Massenexport als Datenstrom: die Werte werden blockweise gelesen und sofort ausgeliefert,
+    # der Speicherbedarf hängt nicht von der Länge des Zeitraums ab
+    period = parse_range_args(request.args)
+    resolution = request.args.get("resolution", "1h")
+    export_format = request.args.get("format", "csv")
+    if period is None or resolution not in EXPORT_MEASUREMENTS or export_format not in EXPORT_FORMATS:
+        return jsonify({"error": "Ungültige Parameter (from/to, resolution: " + ", ".join(EXPORT_MEASUREMENTS)
+                        + ", format: " + ", ".join(EXPORT_FORMATS) + ")"}), 400
+    start, end = period
+    sensors = [name.strip() for name in request.args.get("sensors", "").split(",") if name.strip()] or None
+    try:
+        if export_format != "csv":
+            require_pyarrow()
+        chunks = get_storage_backend().iter_points(resolution, start, end, sensors,
+                                                   chunk_size=get_config().get("export", {}).get("chunk_size", 10000))
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 501
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = f"hadb_{resolution}_{request.args['from'][:10]}_{request.args['to'][:10]}.{extension}"
+    return app.response_class(stream_with_context(iter_export(export_format, chunks)), mimetype=mimetype,
+                              headers={"Content-Disposition": f"attachment; filename={filename}",
+                                       "X-Accel-Buffering": "no"})
+
+@app.route('/')
+def index():
     year = int(request.args.get('year', datetime.now().year))
-    local_zone = ZoneInfo("Europe/Berlin")
-    local_year_start = datetime(year, 1, 1, 0, 0, tzinfo=local_zone)
-    local_year_end = datetime(year + 1, 1, 1, 0, 0, tzinfo=local_zone)
-    start_dt = local_year_start.astimezone(timezone.utc)
-    end_dt = local_year_end.astimezone(timezone.utc)
-    start = start_dt.isoformat().replace('+00:00', 'Z')
-    end = end_dt.isoformat().replace('+00:00', 'Z')
-    config = load_config()
-    influx_client = InfluxDBClient(
-        host=config["influxdb"]["host"],
-        port=config["influxdb"]["port"]
-    )
-    influx_client.switch_database(config["influxdb"]["database"])
-    sensors = get_all_sensors(influx_client)
-
-    monthly_totals = defaultdict(lambda: defaultdict(float))
-    max_day_per_month = defaultdict(lambda: datetime.min.date())
-    raw_data = defaultdict(list)
-
-    for sensor in sensors:
-        sensor_type = get_sensor_type(influx_client, sensor)
-        query = generate_influx_query(sensor, sensor_type, period="1d", start=start, end=end)
-        result = list(influx_client.query(query).get_points())
-        field = "value" if sensor_type == "delta" else "sum"
-        for r in result:
-            try:
-                dt = datetime.strptime(r['time'], "%Y-%m-%dT%H:%M:%SZ")
-                if dt.year == year:
-                    month_key = f"{dt.month:02d}"
-                    val = round(r.get(field, 0), 4)
-                    if val > 0:
-                        raw_data[(month_key, dt.date(), sensor)].append(val)
-                        if dt.date() > max_day_per_month[month_key]:
-                            max_day_per_month[month_key] = dt.date()
-            except:
-                continue
-
-    for (month, day, sensor), values in raw_data.items():
-        if day <= max_day_per_month[month]:
-            monthly_totals[month][sensor] += sum(values)
-
-    all_months = sorted(monthly_totals.keys())
-    month_categories = [month_labels[m] for m in all_months]
-
-    series_dict = {sensor: [] for sensor in sensors}
-    total_kwh = sum(
-        sum(sensor_data.values())
-        for sensor_data in monthly_totals.values()
-    )
-    for sensor in sensors:
-        for m in all_months:
-            value = monthly_totals[m].get(sensor, 0)
-            series_dict[sensor].append({'x': month_labels[m], 'y': round(value, 4)})
-
-    series = sorted(series_dict.items(), key=lambda s: sum(p['y'] for p in s[1]))
-    series.reverse()
-    series_data = json.dumps([{'name': name, 'data': data} for name, data in series])
-
-    return render_template("drilldown_year.html", year=year, series_data=series_data, month_categories=month_categories, total_kwh=round(total_kwh, 2))
+    with span("render"):
+        return render_template("drilldown_year.html", year=year, api_url=f"/api/v1/year/{year}")
 
 @app.route('/<int:year>/<int:month>')
 def view_month(year, month):
-    from collections import defaultdict
-    import calendar
-    local_zone = ZoneInfo("Europe/Berlin")
-    local_month_start = datetime(year, month, 1, 0, 0, tzinfo=local_zone)
-    if month == 12:
-        local_month_end = datetime(year + 1, 1, 1, 0, 0, tzinfo=local_zone)
-    else:
-        local_month_end = datetime(year, month + 1, 1, 0, 0, tzinfo=local_zone)
-    
-    start_dt = local_month_start.astimezone(timezone.utc)
-    end_dt = local_month_end.astimezone(timezone.utc)
-    start = start_dt.isoformat().replace('+00:00', 'Z')
-    end = end_dt.isoformat().replace('+00:00', 'Z')
-    start_dt = datetime.strptime(start, "%Y-%m-%dT%H:%M:%SZ")
-    end_dt = datetime.strptime(end, "%Y-%m-%dT%H:%M:%SZ")
-    config = load_config()
-    influx_client = InfluxDBClient(
-        host=config["influxdb"]["host"],
-        port=config["influxdb"]["port"]
-    )
-    influx_client.switch_database(config["influxdb"]["database"])
-    sensors = get_all_sensors(influx_client)
-
-    daily_totals = defaultdict(lambda: defaultdict(float))
-
-    for sensor in sensors:
-        sensor_type = get_sensor_type(influx_client, sensor)
-        query = generate_influx_query(sensor, sensor_type, period="1d", start=start, end=end)
-        result = list(influx_client.query(query).get_points())
-        field = "value" if sensor_type == "delta" else "sum"
-
-        for r in result:
-            try:
-                dt = datetime.strptime(r['time'], "%Y-%m-%dT%H:%M:%SZ")
-                if dt.year == year and dt.month == month:
-                    key = dt.strftime("%d")
-                    val = round(r.get(field, 0), 4)
-                    if val > 0:
-                        daily_totals[key][sensor] += val
-            except:
-                continue
-
-    all_days = [f"{i:02d}" for i in range(1, 32)]
-    series_dict = {sensor: [] for sensor in sensors}
-    total_kwh = sum(
-        sum(sensor_data.values())
-        for sensor_data in daily_totals.values()
-    )
-
-    for sensor in sensors:
-        for d in all_days:
-            value = daily_totals[d].get(sensor, 0)
-            series_dict[sensor].append({'x': d[-2:], 'y': round(value, 4)})
-
-    series = sorted(series_dict.items(), key=lambda s: sum(p['y'] for p in s[1]))
-    series.reverse()
-    series_data = json.dumps([{'name': name, 'data': data} for name, data in series])
-
-    return render_template("drilldown_month.html", year=year, month=month, series_data=series_data, total_kwh=round(total_kwh, 2))
+    with span("render"):
+        return render_template("drilldown_month.html", year=year, month=month,
+                               api_url=f"/api/v1/month/{year}/{month:02d}")
 
 
 @app.route('/<int:year>/<int:month>/<int:day>')
 def view_day(year, month, day):
-    from collections import defaultdict
-    local_zone = ZoneInfo("Europe/Berlin")
-    local_day_start = datetime(year, month, day, 0, 0, tzinfo=local_zone)
-    start_dt = local_day_start.astimezone(timezone.utc)
-    end_dt = (local_day_start + timedelta(hours=24)).astimezone(timezone.utc)
-    start = start_dt.isoformat().replace("+00:00", "Z")
-    end = end_dt.isoformat().replace("+00:00", "Z")
-
-    config = load_config()
-    influx_client = InfluxDBClient(
-        host=config["influxdb"]["host"],
-        port=config["influxdb"]["port"]
-    )
-    influx_client.switch_database(config["influxdb"]["database"])
-
-    sensors = get_all_sensors(influx_client)
-
-    daily_data = defaultdict(lambda: defaultdict(float))
-    for sensor in sensors:
-        sensor_type = get_sensor_type(influx_client, sensor)
-        query = generate_influx_query(sensor, sensor_type, period="1h", start=start, end=end)
-        result = list(influx_client.query(query).get_points())
-        field = "value" if sensor_type == "delta" else "sum"
-        for r in result:
-            try:
-                dt = datetime.strptime(r['time'], "%Y-%m-%dT%H:%M:%SZ")
-                dt = dt.replace(tzinfo=timezone.utc).astimezone(ZoneInfo("Europe/Berlin"))
-                hour = dt.strftime("%H")
-
-                val = round(r.get(field, 0), 4)
-                if val > 0:
-                    daily_data[hour][sensor] += val
-            except:
-                continue
-
-    all_hours = [f"{i:02d}" for i in range(24)]
-
-    total_kwh = sum(
-        sum(sensor_data.values())
-        for sensor_data in daily_data.values()
-    )
-
-    series_dict = {sensor: [] for sensor in sensors}
-    for sensor in sensors:
-        for h in all_hours:
-            value = daily_data[h].get(sensor, 0)
-            series_dict[sensor].append({'x': h, 'y': round(value, 4)})
-
-    series = sorted(series_dict.items(), key=lambda s: sum(p['y'] for p in s[1]))
-    series.reverse()
-    # KORREKTUR: Tupel-Entpackung statt Zugriff auf Dict
-    series_data = json.dumps([{'name': name, 'data': data} for name, data in series])
-
     prev_dt = datetime(year, month, day) - timedelta(days=1)
     next_dt = datetime(year, month, day) + timedelta(days=1)
 
-    return render_template("drilldown_day.html",
-        year=year, month=month, day=day,
-        prev_year=prev_dt.year, prev_month=prev_dt.month, prev_day=prev_dt.day,
-        next_year=next_dt.year, next_month=next_dt.month, next_day=next_dt.day,
-        series_data=series_data,
-        total_kwh=round(total_kwh, 2)
-    )
-
+    with span("render"):
+        return render_template("drilldown_day.html",
+            year=year, month=month, day=day,
+            prev_year=prev_dt.year, prev_month=prev_dt.month, prev_day=prev_dt.day,
+            next_year=next_dt.year, next_month=next_dt.month, next_day=next_dt.day,
+            api_url=f"/api/v1/day/{year}/{month:02d}/{day:02d}",
+            live=datetime.now(get_local_zone()).date() == datetime(year, month, day).date()
+        )
+
+
+@app.route('/total/range')
+def total_range():
+    if parse_range_args(request.args) is None:
+        return "Ungültige Parameter (from/to im Format JJJJ-MM-TT)", 400
+    heading = f"Verbrauch {request.args['from']} bis {request.args['to']}"
+    with span("render"):
+        return render_template("total_per_sensor.html", heading=heading, back_url="/",
+                               api_url=Markup("/api/v1/total/range?" + urlencode(
+                                   {"from": request.args["from"], "to": request.args["to"]})))
 
 @app.route('/total/<string:view_type>/<int:year>', defaults={'month': None, 'day': None})
 @app.route('/total/<string:view_type>/<int:year>/<int:month>', defaults={'day': None})
 @app.route('/total/<string:view_type>/<int:year>/<int:month>/<int:day>')
 def total_per_sensor(view_type, year, month, day):
-    from collections import defaultdict
-    config = load_config()
-    influx_client = InfluxDBClient(
-        host=config["influxdb"]["host"],
-        port=config["influxdb"]["port"]
-    )
-    influx_client.switch_database(config["influxdb"]["database"])
-    sensors = get_all_sensors(influx_client)
-
-    if view_type == "year":
-        start, end = get_year_range(year)
-        heading = f"Jahresverbrauch {year}"
-        back_url = f"/?year={year}"
-    elif view_type == "month" and month:
-        start, end = get_month_range(year, month)
-        heading = f"Monatsverbrauch {year}-{month:02d}"
-        back_url = f"/{year}/{month:02d}"
-    elif view_type == "day" and month and day:
-        start, end = get_day_range(year, month, day)
-        heading = f"Tagesverbrauch {year}-{month:02d}-{day:02d}"
-        back_url = f"/{year}/{month:02d}/{day:02d}"
-    else:
+    period = get_total_period(view_type, year, month, day)
+    if period is None:
         return "Ungültige Parameter", 400
-
-    totals = {}
-    total_kwh = 0.0
-    for sensor in sensors:
-        sensor_type = get_sensor_type(influx_client, sensor)
-        query = generate_influx_query(sensor, sensor_type, period="1h", start=start, end=end)
-        result = list(influx_client.query(query).get_points())
-        field = "value" if sensor_type == "delta" else "sum"
-        total = sum(round(r.get(field, 0), 4) for r in result if r.get(field, 0) > 0)
-        if total > 0:
-            totals[sensor] = total
-            total_kwh += total
-
-    sorted_data = sorted(totals.items(), key=lambda x: x[1], reverse=True)
-    series_data = json.dumps([{"name": "Gesamtverbrauch", "data": [{"x": sensor, "y": round(val, 2)} for sensor, val in sorted_data]}])
-
-    return render_template("total_per_sensor.html", heading=heading, series_data=series_data, total_kwh=round(total_kwh, 2), back_url=back_url)
+    _, _, _, heading, back_url = period
+    api_url = "/api/v1" + request.path
+    with span("render"):
+        return render_template("total_per_sensor.html", heading=heading, back_url=back_url, api_url=api_url)
 
 
 if __name__ == "__main__":
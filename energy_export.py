@@ -0,0 +1,98 @@
+import numpy as np
+
+# Export als CSV, Parquet oder Arrow-IPC-Stream. Die Blöcke (entity_id, Zeiten, Werte) aus dem
+# Speicher-Backend werden einzeln umgewandelt und sofort weitergegeben; im Speicher liegt immer
+# nur ein Block. pyarrow ist optional und wird erst für Parquet/Arrow geladen.
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
+
+def csv_field(value):
+    if any(ch in value for ch in ',"\n\r'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+def iter_csv(chunks):
+    yield "time,entity_id,value\n"
+    for entity_id, times, values in chunks:
+        stamps = np.datetime_as_string(times.astype("datetime64[s]"), unit="s")
+        name = csv_field(entity_id)
+        yield "".join(f"{stamp}Z,{name},{value!r}\n" for stamp, value in zip(stamps, values.tolist()))
+
+class _ChunkSink:
+    # Dateiartiges Ziel für pyarrow; gesammelte Bytes werden nach jedem Block abgeholt
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+def require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise RuntimeError("Für Parquet/Arrow wird das Paket pyarrow benötigt (pip install pyarrow)")
+    return pyarrow
+
+def arrow_schema(pa):
+    return pa.schema([("time", pa.timestamp("s", tz="UTC")), ("entity_id", pa.string()), ("value", pa.float64())])
+
+def _iter_arrow_batches(pa, chunks):
+    schema = arrow_schema(pa)
+    for entity_id, times, values in chunks:
+        yield pa.record_batch([
+            pa.array(times, type=pa.timestamp("s", tz="UTC")),
+            pa.array([entity_id] * len(times), type=pa.string()),
+            pa.array(values, type=pa.float64()),
+        ], schema=schema)
+
+def iter_arrow(chunks):
+    pa = require_pyarrow()
+    import pyarrow.ipc
+    sink = _ChunkSink()
+    writer = pyarrow.ipc.new_stream(sink, arrow_schema(pa))
+    for batch in _iter_arrow_batches(pa, chunks):
+        writer.write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+def iter_parquet(chunks, row_group_rows=100000):
+    # Ein Row Group je ~row_group_rows Zeilen; der Footer folgt am Ende
+    pa = require_pyarrow()
+    import pyarrow.parquet
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, arrow_schema(pa), compression="zstd")
+    pending, pending_rows = [], 0
+    for batch in _iter_arrow_batches(pa, chunks):
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        if pending_rows >= row_group_rows:
+            writer.write_table(pa.Table.from_batches(pending))
+            pending, pending_rows = [], 0
+            yield sink.drain()
+    if pending:
+        writer.write_table(pa.Table.from_batches(pending))
+    writer.close()
+    yield sink.drain()
+
+def iter_export(export_format, chunks):
+    if export_format == "csv":
+        return (part.encode("utf-8") for part in iter_csv(chunks))
+    if export_format == "arrow":
+        return iter_arrow(chunks)
+    return iter_parquet(chunks)
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from common import save_json
+
+# Kumulierter Verbrauch je Sensor in Stundenauflösung: cumulative[i] ist die Summe aller positiven
+# Stundenwerte vor Stunde base_hour + i. Der Verbrauch eines beliebigen Zeitraums ist damit
+# cumulative[bis] - cumulative[von], unabhängig von der Länge des Zeitraums.
+# Die Dateien wachsen nur; hours im Index (index.json) gibt an, wie viele Stunden gültig sind.
+
+HOUR = 3600
+
+class EnergyIndex:
+    INDEX = "index.json"
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._index = None
+        self._index_mtime = None
+        self._arrays = {}
+
+    def entries(self):
+        index_file = self.path / self.INDEX
+        try:
+            mtime = index_file.stat().st_mtime_ns
+        except OSError:
+            return {}
+        with self._lock:
+            if self._index is None or mtime != self._index_mtime:
+                with open(index_file, "r") as f:
+                    self._index = json.load(f)
+                self._index_mtime = mtime
+            return self._index
+
+    def _save(self, index):
+        save_json(self.path / self.INDEX, index)
+        self._index = index
+        self._index_mtime = (self.path / self.INDEX).stat().st_mtime_ns
+
+    def end_hour(self, entity_id):
+        # Erste Stunde, die noch nicht im Index steht (None: Sensor fehlt im Index)
+        entry = self.entries().get(entity_id)
+        return entry["base_hour"] + entry["hours"] if entry and entry["hours"] else None
+
+    def _cumulative(self, entity_id, entry):
+        key = (entry["file"], entry["base_hour"], entry["hours"])
+        with self._lock:
+            array = self._arrays.get(entity_id)
+            if array is None or array[0] != key:
+                data = np.memmap(self.path / entry["file"], dtype="<f8", mode="r", shape=(entry["hours"] + 1,))
+                array = (key, data)
+                self._arrays[entity_id] = array
+        return array[1]
+
+    def range_total(self, entity_id, start_ts, end_ts):
+        entry = self.entries().get(entity_id)
+        if not entry or not entry["hours"]:
+            return None
+        cumulative = self._cumulative(entity_id, entry)
+        lo = min(max(start_ts // HOUR - entry["base_hour"], 0), entry["hours"])
+        hi = min(max(end_ts // HOUR - entry["base_hour"], 0), entry["hours"])
+        return float(cumulative[hi] - cumulative[lo]) if hi > lo else 0.0
+
+    def range_totals(self, start_ts, end_ts):
+        return {entity_id: self.range_total(entity_id, start_ts, end_ts) for entity_id in self.entries()}
+
+    def _extend_front(self, entry, hours, values):
+        # Stunden vor base_hour nachladen: die Datei wird neu geschrieben und per os.replace getauscht.
+        # Ein Leser, der die alte Datei memory-mapped hat, liest deren Inhalt bis zum Neuladen weiter.
+        file_path = self.path / entry["file"]
+        old = np.fromfile(file_path, dtype="<f8", count=entry["hours"] + 1)
+        first = int(hours[0])
+        shift = entry["base_hour"] - first
+        replaced = np.zeros(int(hours[-1]) - first + 1)
+        positive = np.isfinite(values) & (values > 0)
+        np.add.at(replaced, hours[positive] - first, values[positive])
+        hourly = np.zeros(max(shift + entry["hours"], len(replaced)))
+        hourly[shift:shift + entry["hours"]] = np.diff(old)
+        hourly[:len(replaced)] = replaced
+        tmp_file = file_path.with_name(file_path.name + ".tmp")
+        np.concatenate(([0.0], np.cumsum(hourly))).astype("<f8").tofile(tmp_file)
+        os.replace(tmp_file, file_path)
+        return dict(entry, base_hour=first, hours=len(hourly))
+
+    def update(self, entity_id, epoch_seconds, values, truncate=True):
+        # Stundenwerte ab der ersten übergebenen Stunde ersetzen; alles danach wird verworfen.
+        # truncate=False (Nachladen einer Lücke): nur die übergebenen Stunden ersetzen und die
+        # späteren Summen um die Differenz verschieben. Aufruf nur aus dem Schreib-Thread des Importers.
+        hours = np.asarray(epoch_seconds).astype(np.int64) // HOUR
+        values = np.asarray(values, dtype=np.float64)
+        if not len(hours):
+            return
+        with self._lock:
+            index = {name: dict(entry) for name, entry in self.entries().items()}
+            entry = index.get(entity_id)
+            first = int(hours[0])
+            if not truncate and entry is not None and entry["hours"] and first < entry["base_hour"]:
+                index[entity_id] = self._extend_front(entry, hours, values)
+                self._save(index)
+                return
+            if entry is None or not entry["hours"] or first < entry["base_hour"]:
+                # Neu aufbauen, wenn der Sensor fehlt oder ältere Stunden hinzukommen
+                entry = {"file": hashlib.sha1(entity_id.encode("utf-8")).hexdigest()[:16] + ".cum",
+                         "base_hour": first, "hours": 0}
+            file_path = self.path / entry["file"]
+            start = min(first - entry["base_hour"], entry["hours"])
+            hourly = np.zeros(int(hours[-1]) - entry["base_hour"] + 1 - start)
+            positive = np.isfinite(values) & (values > 0)
+            np.add.at(hourly, hours[positive] - entry["base_hour"] - start, values[positive])
+            needed = start + len(hourly) + 1
+
+            # Nie kürzen: das Dashboard kann die Datei gerade memory-mapped lesen
+            self.path.mkdir(parents=True, exist_ok=True)
+            size = file_path.stat().st_size // 8 if file_path.exists() else 0
+            if size < needed:
+                with open(file_path, "ab") as f:
+                    np.zeros(needed - size, dtype="<f8").tofile(f)
+            if not truncate and needed <= entry["hours"]:
+                data = np.memmap(file_path, dtype="<f8", mode="r+", shape=(entry["hours"] + 1,))
+                previous = data[needed - 1] - data[start]
+                data[start + 1:needed] = data[start] + np.cumsum(hourly)
+                data[needed:] += data[needed - 1] - data[start] - previous
+                needed = entry["hours"] + 1
+            else:
+                data = np.memmap(file_path, dtype="<f8", mode="r+", shape=(needed,))
+                if start == 0:
+                    data[0] = 0.0
+                data[start + 1:needed] = data[start] + np.cumsum(hourly)
+            data.flush()
+            del data
+            entry["hours"] = needed - 1
+            index[entity_id] = entry
+            self._save(index)
@@ -1,14 +1,66 @@
 import tarfile
 import os
 from pathlib import Path
-import shutil
+import hashlib
 import json
 from datetime import datetime
 import platform
+from common import load_config, save_json
 
-def load_config():
-    with open(Path(__file__).parent / "config.json", "r") as f:
-        return json.load(f)
+DB_NAME = "home-assistant_v2.db"
+MANIFEST_NAME = "backup_manifest.json"
+INNER_ARCHIVE = "homeassistant.tar.gz"
+CHUNK_SIZE = 1024 * 1024
+def get_output_dir(config):
+    return Path(__file__).parent / config["sqlite_dir"]
+
+def load_manifest(config=None):
+    config = config or load_config()
+    try:
+        with open(get_output_dir(config) / MANIFEST_NAME, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest, config=None):
+    config = config or load_config()
+    save_json(get_output_dir(config) / MANIFEST_NAME, manifest)
+
+def mark_imported(db_sha256, sensors_sha256):
+    manifest = load_manifest()
+    manifest["imported_sha256"] = db_sha256
+    manifest["imported_sensors_sha256"] = sensors_sha256
+    manifest["imported"] = datetime.now().isoformat(timespec="seconds")
+    save_manifest(manifest)
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def stream_db_from_backup(backup_path, target_path):
+    # Nur die Datenbank aus dem inneren homeassistant.tar.gz lesen, ohne das Backup zu entpacken
+    sha256 = hashlib.sha256()
+    with tarfile.open(backup_path, "r") as outer:
+        inner_member = next((m for m in outer if m.isfile() and Path(m.name).name == INNER_ARCHIVE), None)
+        if inner_member is None:
+            print(f"[Info] Datei {INNER_ARCHIVE} nicht im Backup gefunden.")
+            return None
+
+        with tarfile.open(fileobj=outer.extractfile(inner_member), mode="r|gz") as inner:
+            for member in inner:
+                if member.isfile() and Path(member.name).name == DB_NAME:
+                    source = inner.extractfile(member)
+                    with open(target_path, "wb") as target:
+                        while chunk := source.read(CHUNK_SIZE):
+                            sha256.update(chunk)
+                            target.write(chunk)
+                    return sha256.hexdigest()
+
+    print(f"[Info] Datei {DB_NAME} nicht gefunden.")
+    return None
 
 def extract_latest_ha_db():
     config = load_config()
@@ -19,53 +71,49 @@ def extract_latest_ha_db():
     else:
         backup_dir = Path(config["backup_dir_linux"])
 
-    output_dir = Path(__file__).parent / config["sqlite_dir"]
-    temp_dir = output_dir / "temp_extract"
+    output_dir = get_output_dir(config)
     output_dir.mkdir(parents=True, exist_ok=True)
-    temp_dir.mkdir(parents=True, exist_ok=True)
-    try:
-        today = datetime.now().strftime("%Y-%m-%d")
-        final_path = output_dir / "home-assistant_v2.db"
-
-        if final_path.exists():
-            modified_date = datetime.fromtimestamp(final_path.stat().st_mtime).strftime("%Y-%m-%d")
-            if modified_date == today:
-                print(f"[Info] Die Datei home-assistant_v2.db wurde heute ({today}) bereits extrahiert. Vorgang wird übersprungen.")
-                return str(final_path)
-
-        backups = sorted(backup_dir.glob("*.tar"), key=os.path.getmtime, reverse=True)
-        if not backups:
-            print("[Info] Kein Backup gefunden in", backup_dir)
-            return None
-
-        latest_backup = backups[0]
-        print(f"[Backup] Letztes Backup gefunden: {latest_backup.name}")
+    final_path = output_dir / DB_NAME
+    part_path = output_dir / (DB_NAME + ".part")
 
-        with tarfile.open(latest_backup, "r") as tar:
-            tar.extractall(path=temp_dir)
+    backups = sorted(backup_dir.glob("*.tar"), key=os.path.getmtime, reverse=True)
+    if not backups:
+        print("[Info] Kein Backup gefunden in", backup_dir)
+        return None
 
-        inner_tar_path = temp_dir / "homeassistant.tar.gz"
-        if not inner_tar_path.exists():
-            print("[Info] Datei homeassistant.tar.gz nicht im Backup gefunden.")
-            return None
+    latest_backup = backups[0]
+    stat = latest_backup.stat()
+    manifest = load_manifest(config)
+    if (final_path.exists() and manifest.get("backup") == latest_backup.name
+            and manifest.get("size") == stat.st_size and manifest.get("mtime") == stat.st_mtime):
+        print(f"[Info] Backup {latest_backup.name} ist unverändert. Extraktion wird übersprungen.")
+        return str(final_path)
 
-        with tarfile.open(inner_tar_path, "r") as inner_tar:
-            inner_tar.extractall(path=temp_dir)
+    print(f"[Backup] Letztes Backup gefunden: {latest_backup.name}")
 
-        db_path = next(temp_dir.rglob("home-assistant_v2.db"), None)
-        if not db_path:
-            print("[Info] Datei home-assistant_v2.db nicht gefunden.")
+    try:
+        digest = stream_db_from_backup(latest_backup, part_path)
+        if not digest:
             return None
 
-        shutil.copy(db_path, final_path)
-        print(f"[OK] Datenbank erfolgreich extrahiert nach: {final_path}")
+        if config.get("verify_sha256", False) and file_sha256(part_path) != digest:
+            print(f"[Fehler] Prüfsumme der extrahierten Datei {DB_NAME} stimmt nicht.")
+            return None
 
-        shutil.rmtree(temp_dir)
+        part_path.replace(final_path)
+        manifest.update({
+            "backup": latest_backup.name,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "db_sha256": digest,
+            "extracted": datetime.now().isoformat(timespec="seconds"),
+        })
+        save_manifest(manifest, config)
+        print(f"[OK] Datenbank erfolgreich extrahiert nach: {final_path} (sha256 {digest[:12]})")
         return str(final_path)
 
     finally:
-        if temp_dir.exists():
-            shutil.rmtree(temp_dir, ignore_errors=True)
+        part_path.unlink(missing_ok=True)
 
 if __name__ == "__main__":
     extract_latest_ha_db()
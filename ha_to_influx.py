@@ -1,97 +1,298 @@
 
-import sqlite3
 import pandas as pd
 from influxdb import InfluxDBClient
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 from pathlib import Path
 import json
-from extract_latest_ha_db import extract_latest_ha_db
+import time
+import argparse
+import sys
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from common import load_config, save_json
+from extract_latest_ha_db import extract_latest_ha_db, get_output_dir, load_manifest, mark_imported
+from dashboard_cache import INVALIDATION_RETENTION_DAYS, invalidate_range
+from line_protocol import DEFAULT_BATCH_SIZE
+from import_pipeline import SQLiteReaderPool, StorageWriterStage
+from instrumentation import StageTimer
+from storage import create_backend
+from energy_index import EnergyIndex
+from import_coverage import DAY, find_gaps, format_gaps, missing_values, source_daily_counts
+from sensor_types import (DEFAULT_TYPES_FILE, kwh_factor, load_sensor_types, resolve_sensor_types,
+                          save_sensor_types)
 
-def load_config():
-    with open(Path(__file__).parent / "config.json", "r") as f:
-        return json.load(f)
+LOCAL_ZONE = "Europe/Berlin"
+DEFAULT_CHUNK_SIZE = 10000
+# Summierte Zeitanteile aller Worker (SQLite lesen, Verdichten, Warten auf den Schreib-Thread) je Aufruf von main
+import_timer = StageTimer()
 
-def get_latest_timestamp(influx_client, friendly_name):
-    query = f"""SELECT last(\"value\") FROM \"energy\"
-WHERE \"entity_id\" = '{friendly_name}'"""
-    result = list(influx_client.query(query).get_points())
-    if not result:
-        return None
+def load_watermark_state(state_file, max_age_hours, backend_name="influxdb"):
     try:
-        return datetime.fromisoformat(result[0]['time'].replace('Z', '+00:00'))
-    except Exception as e:
-        print(f" Fehler beim Lesen des Zeitstempels für {friendly_name}: {e}")
+        with open(state_file, "r") as f:
+            state = json.load(f)
+        updated = datetime.fromisoformat(state["updated"])
+    except (OSError, ValueError, KeyError):
+        return None
+    if datetime.now(timezone.utc) - updated > timedelta(hours=max_age_hours):
+        return None
+    # Nach einem Wechsel von storage.backend gelten die Zeitstempel des anderen Speichers nicht
+    if state.get("backend", "influxdb") != backend_name:
         return None
+    return {
+        measurement: {name: datetime.fromisoformat(ts) if ts else None for name, ts in marks.items()}
+        for measurement, marks in state.get("watermarks", {}).items()
+    }
 
-def get_metadata_id(conn, sensor_id):
-    result = pd.read_sql_query(
-        f"SELECT id FROM statistics_meta WHERE statistic_id = '{sensor_id}'", conn)
-    return result.iloc[0]['id'] if not result.empty else None
-
-def detect_sensor_type(df):
-    if df.empty or 'state' not in df or 'sum' not in df:
-        return "unknown"
-    df = df.dropna(subset=['state', 'sum'])
-    if df.empty:
-        return "unknown"
-    ratio = (df['state'] / df['sum']).clip(upper=1)
-    return "counter" if (ratio > 0.9).mean() > 0.9 else "delta"
-
-def import_sensor_data(db_path, influx_client, sensor_id, friendly_name, start_date):
-    conn = sqlite3.connect(db_path)
-    metadata_id = get_metadata_id(conn, sensor_id)
-    if metadata_id is None:
-        print(f" Keine metadata_id für {sensor_id}")
-        conn.close()
-        return
-
-    query = f"""
-            SELECT start_ts, state, sum FROM statistics
-            WHERE metadata_id = {metadata_id} AND start_ts > {int(start_date.timestamp())}
-            ORDER BY start_ts ASC
-            """
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-
-    if df.empty:
-        print(f" Keine neuen Daten für {friendly_name}")
-        return
+def save_watermark_state(state_file, watermarks, backend_name="influxdb"):
+    state = {
+        "updated": datetime.now(timezone.utc).isoformat(),
+        "backend": backend_name,
+        "watermarks": {
+            measurement: {name: ts.isoformat() if ts else None for name, ts in marks.items()}
+            for measurement, marks in watermarks.items()
+        }
+    }
+    save_json(state_file, state)
 
-    df['timestamp'] = pd.to_datetime(df['start_ts'], unit='s', utc=True)
-    df['state'] = pd.to_numeric(df['state'], errors='coerce')
-    df['sum'] = pd.to_numeric(df['sum'], errors='coerce')
-    df = df.dropna(subset=['timestamp'])
+def iter_statistics(conn, metadata_id, after_ts, table="statistics", chunk_size=DEFAULT_CHUNK_SIZE, before_ts=None):
+    # Zeilen blockweise lesen, damit auch ein Import ab 1970 nur begrenzt Speicher braucht
+    before_clause = "" if before_ts is None else f" AND start_ts < {int(before_ts)}"
+    cursor = conn.execute(
+        f"SELECT start_ts, state, sum FROM {table} WHERE metadata_id = ? AND start_ts > ?{before_clause} "
+        f"ORDER BY start_ts ASC",
+        (int(metadata_id), after_ts))
+    try:
+        while True:
+            with import_timer.span("sqlite_read"):
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                df = pd.DataFrame(rows, columns=['start_ts', 'state', 'sum'])
+                df['timestamp'] = pd.to_datetime(df['start_ts'], unit='s', utc=True)
+                df['state'] = pd.to_numeric(df['state'], errors='coerce')
+                df['sum'] = pd.to_numeric(df['sum'], errors='coerce')
+                df = df.dropna(subset=['timestamp'])
+            yield df
+    finally:
+        cursor.close()
 
-    sensor_type = detect_sensor_type(df)
+def compute_hourly_kwh(df, sensor_type, previous_sum=None, unit_factor=1):
+    # Verbrauch je Stunde: delta-Sensoren liefern ihn direkt, Zähler über die Differenz der Summe.
+    # unit_factor rechnet die Einheit des Sensors (Wh, MWh, ...) in kWh um.
     if sensor_type == "delta":
-        df['value'] = df['state']
-    elif sensor_type == "counter":
-        df['value'] = df['sum']
+        values = df['state']
     else:
+        df = df.dropna(subset=['sum'])
+        values = df['sum'].diff()
+        if previous_sum is not None and not df.empty:
+            values.iloc[0] = df['sum'].iloc[0] - previous_sum
+    return pd.Series(values.to_numpy() * unit_factor, index=pd.DatetimeIndex(df['timestamp'])).dropna()
+
+def build_rollups(hourly, zone=LOCAL_ZONE):
+    local = hourly.index.tz_convert(zone).tz_localize(None)
+    rollups = {"energy_1h": hourly}
+    for measurement, buckets in (("energy_1d", local.normalize()),
+                                 ("energy_1mo", local.to_period("M").to_timestamp())):
+        grouped = hourly.groupby(buckets).sum()
+        # Fällt Mitternacht in eine Zeitumstellung (z. B. America/Santiago), beginnt der Tag wie bei
+        # zoneinfo zur ersten gültigen bzw. ersten doppelten Uhrzeit
+        grouped.index = grouped.index.tz_localize(zone, nonexistent="shift_forward", ambiguous=True).tz_convert("UTC")
+        rollups[measurement] = grouped
+    return rollups
+
+def update_rollups(conn, writer, metadata_id, friendly_name, sensor_type, since, chunk_size=DEFAULT_CHUNK_SIZE,
+                   zone=LOCAL_ZONE, energy_index=None, until=None, unit_factor=1):
+    # Betroffenen Monat (lokale Zeit) vollständig neu berechnen, eine Stunde davor für die Zählerdifferenz.
+    # Mit until (Nachladen einer Lücke) nur bis zum Ende des Monats lesen, in dem die Lücke endet.
+    local_since = since.astimezone(ZoneInfo(zone))
+    month_start = pd.Timestamp(local_since.replace(day=1, hour=0, minute=0, second=0, microsecond=0))
+    day_start = local_since.replace(hour=0, minute=0, second=0, microsecond=0)
+    before_ts = day_end = None
+    if until is not None:
+        local_last = (until - timedelta(seconds=1)).astimezone(ZoneInfo(zone))
+        day_end = pd.Timestamp(datetime.combine(local_last.date() + timedelta(days=1), datetime.min.time(),
+                                                tzinfo=ZoneInfo(zone)))
+        month_end = datetime(local_last.year + (local_last.month == 12), local_last.month % 12 + 1, 1,
+                             tzinfo=ZoneInfo(zone))
+        before_ts = int(month_end.timestamp())
+
+    day_totals = month_totals = None
+    previous_sum = None
+    last_hour = None
+    written = 0
+    for df in iter_statistics(conn, metadata_id, int(month_start.timestamp()) - 3601, chunk_size=chunk_size,
+                              before_ts=before_ts):
+        with import_timer.span("rollups"):
+            hourly = compute_hourly_kwh(df, sensor_type, previous_sum, unit_factor)
+            if df['sum'].notna().any():
+                previous_sum = df['sum'].dropna().iloc[-1]
+            hourly = hourly[hourly.index >= month_start]
+            if hourly.empty:
+                continue
+
+            rollups = build_rollups(hourly, zone)
+            new_hours = rollups["energy_1h"][rollups["energy_1h"].index >= pd.Timestamp(since)]
+            if until is not None:
+                new_hours = new_hours[new_hours.index < pd.Timestamp(until)]
+        with import_timer.span("write_queue"):
+            written += writer.write_series("energy_1h", {"entity_id": friendly_name},
+                                           new_hours.index.as_unit('s').asi8, new_hours.to_numpy())
+            if energy_index is not None and not new_hours.empty:
+                writer.call(energy_index.update, friendly_name, new_hours.index.as_unit('s').asi8,
+                            new_hours.to_numpy(), until is None)
+        # Tage und Monate können über Blockgrenzen reichen, daher erst am Ende schreiben
+        day_totals = rollups["energy_1d"] if day_totals is None else day_totals.add(rollups["energy_1d"], fill_value=0)
+        month_totals = rollups["energy_1mo"] if month_totals is None else month_totals.add(rollups["energy_1mo"], fill_value=0)
+        last_hour = hourly.index.max()
+
+    if last_hour is None:
+        return None
+    day_totals = day_totals[day_totals.index >= pd.Timestamp(day_start)]
+    if day_end is not None:
+        day_totals = day_totals[day_totals.index < day_end]
+    for measurement, series in (("energy_1d", day_totals), ("energy_1mo", month_totals)):
+        with import_timer.span("write_queue"):
+            written += writer.write_series(measurement, {"entity_id": friendly_name},
+                                           series.index.as_unit('s').asi8, series.to_numpy())
+    print(f" Verdichtungen für {friendly_name} aktualisiert ({written} Werte).")
+    # Geänderter Zeitbereich für die Invalidierung des Dashboard-Caches
+    return day_start, last_hour + pd.Timedelta(hours=1)
+
+def value_column(sensor_type):
+    return "state" if sensor_type == "delta" else "sum"
+
+def import_raw_statistics(conn, writer, metadata_id, friendly_name, sensor_type, after, measurement="energy",
+                          table="statistics", chunk_size=DEFAULT_CHUNK_SIZE, before=None):
+    written = 0
+    latest = None
+    column = value_column(sensor_type)
+    before_ts = None if before is None else int(before.timestamp())
+    for df in iter_statistics(conn, metadata_id, int(after.timestamp()), table=table, chunk_size=chunk_size,
+                              before_ts=before_ts):
+        values = df[column]
+        with import_timer.span("write_queue"):
+            written += writer.write_series(measurement, {"entity_id": friendly_name, "sensor_type": sensor_type},
+                                           df['start_ts'].to_numpy(), values.to_numpy())
+        latest = df['timestamp'].iloc[-1].to_pydatetime()
+    return written, latest
+
+def import_sensor_data(reader_pool, writer, metadata_id, friendly_name, sensor_type, start_date, rollup_since=None,
+                       chunk_size=DEFAULT_CHUNK_SIZE, short_term_since=None, zone=LOCAL_ZONE,
+                       energy_index=None, unit_factor=1):
+    print(f" Verarbeite: {friendly_name}")
+    if sensor_type not in ("delta", "counter"):
         print(f" Unbekannter Sensortyp bei {friendly_name}")
-        return
-
-    json_body = [
-        {
-            "measurement": "energy",
-            "tags": {
-                "entity_id": friendly_name,
-                "sensor_type": sensor_type
-            },
-            "time": row['timestamp'].isoformat(),
-            "fields": {
-                "value": float(row['value'])
-            }
-        }
-        for _, row in df.iterrows()
-    ]
+        return None, None, None
+    started = time.perf_counter()
+    conn = reader_pool.connection()
 
-    if json_body:
-        influx_client.write_points(json_body)
-        print(f" {len(json_body)} Werte für {friendly_name} importiert.")
+    if rollup_since is None or rollup_since > start_date:
+        rollup_since = start_date
+
+    touched = None
+    written, latest = import_raw_statistics(conn, writer, metadata_id, friendly_name, sensor_type, start_date,
+                                            chunk_size=chunk_size)
+    if written:
+        touched = update_rollups(conn, writer, metadata_id, friendly_name, sensor_type, rollup_since,
+                                 chunk_size=chunk_size, zone=zone, energy_index=energy_index,
+                                 unit_factor=unit_factor)
+    elif latest is None:
+        print(f" Keine neuen Daten für {friendly_name}")
+        if rollup_since < start_date:
+            touched = update_rollups(conn, writer, metadata_id, friendly_name, sensor_type, rollup_since,
+                                     chunk_size=chunk_size, zone=zone, energy_index=energy_index,
+                                     unit_factor=unit_factor)
     else:
         print(f" Keine gültigen Werte für {friendly_name}")
 
+    latest_short_term = None
+    if short_term_since is not None:
+        # 5-Minuten-Werte in ein eigenes Measurement, damit sich die Stundenwerte nicht doppeln
+        short_term_written, latest_short_term = import_raw_statistics(
+            conn, writer, metadata_id, friendly_name, sensor_type, short_term_since, measurement="energy_5m",
+            table="statistics_short_term", chunk_size=chunk_size)
+        if short_term_written:
+            print(f" {short_term_written} Kurzzeitwerte für {friendly_name} übergeben.")
+
+    print(f" {friendly_name} in {time.perf_counter() - started:.2f} s verarbeitet.")
+    return touched, latest, latest_short_term
+
+def check_coverage(reader_pool, backend, sensors, sensor_types, latest):
+    # Nur Tage vor dem Tag des letzten importierten Werts; was danach kommt, holt der normale Import
+    conn = reader_pool.connection()
+    source = {}
+    for sensor_id, friendly_name in sensors:
+        entry = sensor_types.get(sensor_id)
+        if entry is None or entry["sensor_type"] not in ("delta", "counter") or not latest.get(friendly_name):
+            continue
+        latest_ts = int(latest[friendly_name].timestamp())
+        counts = source_daily_counts(conn, entry["metadata_id"], value_column(entry["sensor_type"]),
+                                     latest_ts - latest_ts % DAY)
+        if counts:
+            source[friendly_name] = (entry, counts)
+    if not source:
+        return {}
+
+    first_day = min(min(counts) for _, counts in source.values())
+    last_day = max(max(counts) for _, counts in source.values()) + DAY
+    to_iso = lambda ts: datetime.fromtimestamp(ts, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+    target = backend.daily_counts(backend.coverage_measurement, to_iso(first_day), to_iso(last_day))
+
+    coverage = {}
+    for friendly_name, (entry, counts) in source.items():
+        target_counts = target.get(friendly_name, {})
+        gaps = find_gaps(counts, target_counts,
+                         first_row_derived=(backend.coverage_measurement == "energy_1h"
+                                            and entry["sensor_type"] == "counter"))
+        coverage[friendly_name] = (entry, gaps, missing_values(counts, target_counts, gaps))
+    return coverage
+
+def backfill_sensor(reader_pool, writer, metadata_id, friendly_name, sensor_type, gaps,
+                    chunk_size=DEFAULT_CHUNK_SIZE, zone=LOCAL_ZONE, energy_index=None, unit_factor=1):
+    conn = reader_pool.connection()
+    written = 0
+    touched_range = None
+    for start_ts, end_ts in gaps:
+        start = datetime.fromtimestamp(start_ts, tz=timezone.utc)
+        end = datetime.fromtimestamp(end_ts, tz=timezone.utc)
+        gap_written, _ = import_raw_statistics(conn, writer, metadata_id, friendly_name, sensor_type,
+                                               start - timedelta(seconds=1), chunk_size=chunk_size, before=end)
+        written += gap_written
+        touched = update_rollups(conn, writer, metadata_id, friendly_name, sensor_type, start,
+                                 chunk_size=chunk_size, zone=zone, energy_index=energy_index, until=end,
+                                 unit_factor=unit_factor)
+        touched_range = merge_range(touched_range, touched)
+    print(f" {friendly_name}: {len(gaps)} Lücke(n) nachgeladen, {written} Werte.")
+    return written, touched_range
+
+def merge_range(current, touched):
+    # Geänderte Zeitbereiche eines Laufs zu einem zusammenfassen, damit je Import nur eine Invalidierung entsteht
+    if not touched:
+        return current
+    if current is None:
+        return touched
+    return min(current[0], touched[0]), max(current[1], touched[1])
+
+def acquire_import_lock(lock_path):
+    # Sperre über Prozesse hinweg (mehrere Gunicorn-Worker, Flask-Reloader, cron); das Betriebssystem
+    # gibt sie frei, sobald die Datei geschlossen wird oder der Prozess endet
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    lock_file = open(lock_path, "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
 def read_sensor_config(path):
     sensors = []
     with open(path, 'r') as f:
@@ -101,32 +302,209 @@ def read_sensor_config(path):
                 sensors.append((sensor_id.strip(), friendly_name.strip()))
     return sensors
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Überträgt Home-Assistant-Statistiken in die InfluxDB.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Anzahl paralleler Sensor-Worker (Standard: import.workers in config.json)")
+    parser.add_argument("--source", choices=("backup", "live"), default=None,
+                        help="backup: aus dem neuesten HA-Backup, live: direkt aus import.live_db_path")
+    parser.add_argument("--short-term", action="store_true",
+                        help="Zusätzlich 5-Minuten-Werte aus statistics_short_term nach energy_5m übertragen")
+    parser.add_argument("--force", action="store_true",
+                        help="Import auch ausführen, wenn sich Backup und Sensorliste nicht geändert haben")
+    parser.add_argument("--refresh-watermarks", action="store_true",
+                        help="Letzte Zeitstempel immer aus dem Speicher (InfluxDB/lokal) lesen statt aus der Statusdatei")
+    parser.add_argument("--redetect-types", action="store_true",
+                        help="Sensortypen neu aus einer Stichprobe bestimmen statt sensor_types.json zu verwenden")
+    parser.add_argument("--backfill", action="store_true",
+                        help="Nach dem Import Lücken im Speicher (Werte je Tag gegenüber der Quelle) gezielt nachladen")
+    parser.add_argument("--verify", action="store_true",
+                        help="Nur prüfen und Lücken je Sensor ausgeben, nichts schreiben (Exit-Code 1 bei Lücken)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Mehrere Aufrufe im selben Prozess (z. B. Benchmarks) sollen nicht die Zeitanteile der vorherigen mitzählen
+    import_timer.reset()
     config = load_config()
-    db_path = extract_latest_ha_db()
-    if not db_path:
-        print(" Datenbank konnte nicht extrahiert werden.")
-        return
+    import_config = config.get("import", {})
+    lock_file = acquire_import_lock(get_output_dir(config) / "import.lock")
+    if lock_file is None:
+        print(" Es läuft bereits ein Import. Dieser Aufruf wird übersprungen.")
+        return 0
+    source = args.source or import_config.get("source", "backup")
+    if source == "live":
+        # Direkt aus der laufenden (oder eingebundenen) HA-Datenbank lesen, ohne Backup
+        db_path = Path(import_config.get("live_db_path", ""))
+        if not db_path.is_file():
+            print(f" Live-Datenbank nicht gefunden: {db_path}")
+            return 1
+    else:
+        db_path = extract_latest_ha_db()
+        if not db_path:
+            print(" Datenbank konnte nicht extrahiert werden.")
+            return 1
 
     sensor_file_path = Path(__file__).parent / config["sensor_file"]
     if not sensor_file_path.exists():
         print(f" Sensorliste nicht gefunden: {sensor_file_path}")
-        return
+        return 1
 
     sensors = read_sensor_config(sensor_file_path)
-    influx_client = InfluxDBClient(
+    sensors_sha256 = hashlib.sha256(sensor_file_path.read_bytes()).hexdigest()
+    manifest = load_manifest() if source == "backup" else {}
+    db_sha256 = manifest.get("db_sha256")
+    if (not (args.force or args.verify or args.backfill) and db_sha256 and manifest.get("imported_sha256") == db_sha256
+            and manifest.get("imported_sensors_sha256") == sensors_sha256):
+        print(" Backup und Sensorliste unverändert seit dem letzten Import. Import wird übersprungen.")
+        return 0
+
+    backend = create_backend(config, lambda: InfluxDBClient(
         host=config["influxdb"]["host"],
-        port=config["influxdb"]["port"]
-    )
-    influx_client.switch_database(config["influxdb"]["database"])
+        port=config["influxdb"]["port"],
+        database=config["influxdb"]["database"]
+    ))
+    cache_file = Path(__file__).parent / config.get("cache", {}).get("file", "SQLite/dashboard_cache.db")
+    cache_retention_days = config.get("cache", {}).get("retention_days", INVALIDATION_RETENTION_DAYS)
+    batch_size = import_config.get("batch_size", DEFAULT_BATCH_SIZE)
+    chunk_size = import_config.get("chunk_size", DEFAULT_CHUNK_SIZE)
+    workers = args.workers or import_config.get("workers", 4)
+    short_term = args.short_term or import_config.get("short_term", False)
+    zone = config.get("timezone", LOCAL_ZONE)
+    if short_term and backend.name == "local":
+        # Der lokale Speicher hält nur Stundenwerte
+        print(" Hinweis: 5-Minuten-Werte werden mit storage.backend = local nicht importiert.")
+        short_term = False
 
-    for sensor_id, friendly_name in sensors:
-        print(f" Verarbeite: {friendly_name} ({sensor_id})")
-        latest = get_latest_timestamp(influx_client, friendly_name)
-        start_date = latest if latest else datetime.fromtimestamp(0, tz=timezone.utc)
-        import_sensor_data(db_path, influx_client, sensor_id, friendly_name, start_date)
+    epoch = datetime.fromtimestamp(0, tz=timezone.utc)
+    state_file = Path(__file__).parent / import_config.get("state_file", "SQLite/import_state.json")
+    watermarks = None
+    if not args.refresh_watermarks:
+        watermarks = load_watermark_state(state_file, import_config.get("state_max_age_hours", 48), backend.name)
+    if (watermarks is None or any(name not in watermarks.get("energy", {}) for _, name in sensors)
+            or (short_term and "energy_5m" not in watermarks)):
+        watermarks = {
+            "energy": backend.latest_timestamps("energy"),
+            "energy_1h": backend.latest_timestamps("energy_1h"),
+        }
+        if short_term:
+            watermarks["energy_5m"] = backend.latest_timestamps("energy_5m")
+        print(f" Letzte Zeitstempel aus dem Speicher ({backend.name}) gelesen.")
+    else:
+        print(f" Letzte Zeitstempel aus {state_file.name} übernommen.")
+
+    started = time.perf_counter()
+    reader_pool = SQLiteReaderPool(db_path, immutable=(source == "backup"))
+    types_file = Path(__file__).parent / import_config.get("sensor_types_file", DEFAULT_TYPES_FILE)
+    stored_types = load_sensor_types(types_file)
+    influx_types = None
+    if not args.redetect_types and any(sensor_id not in stored_types for sensor_id, _ in sensors):
+        influx_types = backend.sensor_types()
+    sensor_types, types_changed = resolve_sensor_types(reader_pool.connection(), sensors, stored_types,
+                                                       influx_types, redetect=args.redetect_types)
+    if types_changed:
+        save_sensor_types(types_file, sensor_types)
+    if args.verify:
+        coverage = check_coverage(reader_pool, backend, sensors, sensor_types, watermarks["energy"])
+        reader_pool.close()
+        backend.close()
+        incomplete = {name: item for name, item in coverage.items() if item[1]}
+        for friendly_name, (_, gaps, missing) in sorted(incomplete.items()):
+            print(f" {friendly_name}: {missing} Werte fehlen an {sum((end - start) // DAY for start, end in gaps)} "
+                  f"Tag(en): {format_gaps(gaps)}")
+        print(f" Prüfung abgeschlossen: {len(coverage)} Sensoren geprüft, {len(incomplete)} mit Lücken "
+              f"({time.perf_counter() - started:.1f} s).")
+        return 1 if incomplete else 0
+
+    energy_index = EnergyIndex(Path(__file__).parent / config.get("energy_index_dir", "SQLite/energy_index")
+                               / backend.name)
+    new_watermarks = {measurement: dict(marks) for measurement, marks in watermarks.items()}
+    failed = False
+    touched_range = None
+    writer = StorageWriterStage(backend, batch_size=batch_size)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for sensor_id, friendly_name in sensors:
+                entry = sensor_types.get(sensor_id)
+                new_watermarks["energy"].setdefault(friendly_name, None)
+                new_watermarks["energy_1h"].setdefault(friendly_name, None)
+                if short_term:
+                    new_watermarks["energy_5m"].setdefault(friendly_name, None)
+                if entry is None:
+                    print(f" Keine metadata_id oder noch keine Statistik für {sensor_id}")
+                    continue
+                start_date = watermarks["energy"].get(friendly_name) or epoch
+                rollup_since = watermarks["energy_1h"].get(friendly_name) or epoch
+                # Fehlt der Sensor im Energie-Index oder endet der Index früher, ab dort neu verdichten
+                index_end = energy_index.end_hour(friendly_name)
+                index_since = datetime.fromtimestamp(index_end * 3600, tz=timezone.utc) if index_end else epoch
+                rollup_since = min(rollup_since, index_since)
+                short_term_since = None
+                if short_term:
+                    short_term_since = watermarks["energy_5m"].get(friendly_name) or epoch
+                future = executor.submit(import_sensor_data, reader_pool, writer, entry["metadata_id"], friendly_name,
+                                         entry["sensor_type"], start_date, rollup_since, chunk_size,
+                                         short_term_since, zone, energy_index, kwh_factor(entry.get("unit")))
+                futures[future] = friendly_name
+            for future in as_completed(futures):
+                friendly_name = futures[future]
+                try:
+                    touched, latest, latest_short_term = future.result()
+                except Exception as e:
+                    failed = True
+                    print(f" Fehler beim Import von {friendly_name}: {e}")
+                    continue
+                if latest:
+                    new_watermarks["energy"][friendly_name] = latest
+                if touched:
+                    new_watermarks["energy_1h"][friendly_name] = touched[1] - timedelta(hours=1)
+                    touched_range = merge_range(touched_range, touched)
+                if latest_short_term:
+                    new_watermarks["energy_5m"][friendly_name] = latest_short_term
+
+            if args.backfill and not failed:
+                # Erst nach dem Schreiben aller neuen Werte zählen, sonst gälten sie als Lücke
+                writer.flush()
+                coverage = check_coverage(reader_pool, backend, sensors, sensor_types, new_watermarks["energy"])
+                futures = {
+                    executor.submit(backfill_sensor, reader_pool, writer, entry["metadata_id"], friendly_name,
+                                    entry["sensor_type"], gaps, chunk_size, zone, energy_index,
+                                    kwh_factor(entry.get("unit"))): friendly_name
+                    for friendly_name, (entry, gaps, _) in coverage.items() if gaps
+                }
+                print(f" Lückenprüfung: {len(futures)} von {len(coverage)} Sensoren unvollständig.")
+                for future in as_completed(futures):
+                    try:
+                        _, touched = future.result()
+                    except Exception as e:
+                        failed = True
+                        print(f" Fehler beim Nachladen von {futures[future]}: {e}")
+                        continue
+                    touched_range = merge_range(touched_range, touched)
+    finally:
+        if touched_range:
+            # Eine Invalidierung je Lauf; läuft im Schreib-Thread, also erst nachdem alle Werte im Speicher stehen
+            writer.call(invalidate_range, cache_file, *touched_range, cache_retention_days)
+        writer.close()
+        reader_pool.close()
+        backend.close()
+
+    if failed or writer.errors:
+        # Bei Fehlern beim nächsten Lauf wieder den Speicher abfragen
+        state_file.unlink(missing_ok=True)
+    else:
+        save_watermark_state(state_file, new_watermarks, backend.name)
+        if db_sha256:
+            mark_imported(db_sha256, sensors_sha256)
 
-    print(" Import abgeschlossen.")
+    elapsed = time.perf_counter() - started
+    print(f" Import abgeschlossen: {writer.rows} Werte in {elapsed:.1f} s geschrieben "
+          f"({writer.rows / max(elapsed, 1e-6):.0f} Werte/s, {workers} Worker).")
+    import_timer.add(f"{backend.name}_write", writer.seconds)
+    print(f" Zeitanteile (über alle Worker summiert): {import_timer.summary()}")
+    # Rückgabewert 1 bei Fehlern, damit /import/status und cron den Lauf als fehlgeschlagen erkennen
+    return 1 if failed or writer.errors else 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,40 @@
+from datetime import datetime, timezone
+
+# Abdeckung je Sensor: Anzahl Stundenwerte je UTC-Tag in der Quelle (statistics) gegen die im
+# Speicher. Tage, an denen im Speicher Werte fehlen, werden zu zusammenhängenden Bereichen
+# zusammengefasst und gezielt nachgeladen, statt alles ab 1970 neu zu importieren.
+
+DAY = 86400
+
+def source_daily_counts(conn, metadata_id, column, before_ts, table="statistics"):
+    rows = conn.execute(
+        f"SELECT start_ts - (start_ts % {DAY}) AS day, count(*) FROM {table} "
+        f"WHERE metadata_id = ? AND {column} IS NOT NULL AND start_ts < ? GROUP BY day",
+        (int(metadata_id), int(before_ts))).fetchall()
+    return {int(day): count for day, count in rows}
+
+def find_gaps(source_counts, target_counts, first_row_derived=False):
+    # Zähler im lokalen Speicher: die allererste Zeile liefert noch keine Differenz, also keinen Stundenwert
+    expected = dict(source_counts)
+    if first_row_derived and expected:
+        expected[min(expected)] -= 1
+    gaps = []
+    for day in sorted(expected):
+        if target_counts.get(day, 0) >= expected[day]:
+            continue
+        if gaps and gaps[-1][1] == day:
+            gaps[-1][1] = day + DAY
+        else:
+            gaps.append([day, day + DAY])
+    return [(start, end) for start, end in gaps]
+
+def missing_values(source_counts, target_counts, gaps):
+    return sum(source_counts.get(day, 0) - target_counts.get(day, 0)
+               for start, end in gaps for day in range(start, end, DAY))
+
+def format_gaps(gaps, limit=5):
+    def day(ts):
+        return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d")
+    text = ", ".join(day(start) if end - start == DAY else f"{day(start)} – {day(end - DAY)}"
+                     for start, end in gaps[:limit])
+    return text + (f" und {len(gaps) - limit} weitere" if len(gaps) > limit else "")
@@ -0,0 +1,112 @@
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Import im Hintergrund: ha_to_influx.py läuft als Unterprozess in einem eigenen Thread,
+# der Flask-Request kehrt sofort zurück. Es läuft höchstens ein Import gleichzeitig;
+# weitere Auslöser während eines Laufs werden zusammengefasst statt erneut gestartet.
+
+PROGRESS_PREFIX = "Verarbeite:"
+
+class ImportJobRunner:
+    def __init__(self, base_path, log_path, total_sensors=None, log_max_bytes=1024 * 1024):
+        self.base_path = Path(base_path)
+        self.log_path = Path(log_path)
+        self.total_sensors = total_sensors
+        self.log_max_bytes = log_max_bytes
+        self._lock = threading.Lock()
+        self._thread = None
+        self._scheduler = None
+        self._status = {
+            "running": False,
+            "trigger": None,
+            "started": None,
+            "finished": None,
+            "last_duration": None,
+            "returncode": None,
+            "processed": 0,
+            "total": None,
+            "current": None,
+            "next_run": None,
+        }
+
+    def trigger(self, trigger="manual", args=()):
+        # Liefert False, wenn bereits ein Import läuft; der Aufruf wird dann mit diesem zusammengefasst
+        with self._lock:
+            if self._status["running"]:
+                return False
+            self._status.update({
+                "running": True,
+                "trigger": trigger,
+                "started": datetime.now().isoformat(timespec="seconds"),
+                "processed": 0,
+                "total": self.total_sensors() if self.total_sensors else None,
+                "current": None,
+            })
+            self._thread = threading.Thread(target=self._run, args=(list(args),), name="import-job", daemon=True)
+            self._thread.start()
+            return True
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def start_schedule(self, interval_minutes):
+        if interval_minutes <= 0 or self._scheduler is not None:
+            return
+        self._scheduler = threading.Thread(target=self._schedule, args=(interval_minutes * 60,),
+                                           name="import-schedule", daemon=True)
+        self._scheduler.start()
+
+    def _schedule(self, interval):
+        while True:
+            with self._lock:
+                self._status["next_run"] = datetime.fromtimestamp(time.time() + interval).isoformat(timespec="seconds")
+            time.sleep(interval)
+            self.trigger("schedule")
+
+    def _rotate_log(self):
+        try:
+            if self.log_path.stat().st_size > self.log_max_bytes:
+                self.log_path.replace(self.log_path.with_suffix(self.log_path.suffix + ".1"))
+        except OSError:
+            pass
+
+    def _run(self, args):
+        started = time.perf_counter()
+        returncode = None
+        self._rotate_log()
+        with open(self.log_path, "a", encoding="utf-8") as log_file:
+            log_file.write(f"=== {' '.join(['ha_to_influx.py', *args])} gestartet {datetime.now():%Y-%m-%d %H:%M:%S} "
+                           f"({self._status['trigger']}) ===\n")
+            log_file.flush()
+            try:
+                # -u: Ausgabe ungepuffert, damit Log und Fortschritt während des Laufs mitlaufen
+                proc = subprocess.Popen([sys.executable, "-u", "ha_to_influx.py", *args], cwd=self.base_path,
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                        text=True, encoding="utf-8", errors="replace", bufsize=1)
+                for line in proc.stdout:
+                    log_file.write(f"[{datetime.now():%H:%M:%S}] {line}")
+                    log_file.flush()
+                    text = line.strip()
+                    if text.startswith(PROGRESS_PREFIX):
+                        with self._lock:
+                            self._status["processed"] += 1
+                            self._status["current"] = text[len(PROGRESS_PREFIX):].strip()
+                returncode = proc.wait()
+            except Exception as e:
+                log_file.write(f"[{datetime.now():%H:%M:%S}] Fehler beim Start des Imports: {e}\n")
+            elapsed = time.perf_counter() - started
+            log_file.write(f"=== beendet nach {elapsed:.1f} s, Rückgabewert {returncode} ===\n")
+
+        with self._lock:
+            self._status.update({
+                "running": False,
+                "finished": datetime.now().isoformat(timespec="seconds"),
+                "last_duration": round(elapsed, 1),
+                "returncode": returncode,
+                "current": None,
+            })
@@ -0,0 +1,93 @@
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from line_protocol import DEFAULT_BATCH_SIZE
+
+# Bausteine für den parallelen Import: Lesen aus SQLite und Umrechnen laufen in
+# mehreren Worker-Threads, das Schreiben in das Speicher-Backend (InfluxDB oder lokaler
+# Stundenspeicher) in einem eigenen Thread. So überlappen Schreibzugriffe mit dem Lesen
+# der nächsten Sensoren.
+
+class SQLiteReaderPool:
+    def __init__(self, db_path, immutable=False):
+        uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+        if immutable:
+            uri += "&immutable=1"
+        self.uri = uri
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+class StorageWriterStage:
+    def __init__(self, backend, batch_size=DEFAULT_BATCH_SIZE, queue_size=16):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.rows = 0
+        self.seconds = 0.0
+        self.errors = []
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self._thread.start()
+
+    def write_series(self, measurement, tags, epoch_seconds, values):
+        # Blockiert, wenn der Schreib-Thread zurückliegt; begrenzt so den Speicherbedarf
+        self._queue.put(("series", (measurement, tags, epoch_seconds, values)))
+        return int(np.isfinite(np.asarray(values, dtype=np.float64)).sum())
+
+    def call(self, func, *args):
+        self._queue.put(("call", (func, args)))
+
+    def flush(self):
+        # Wartet, bis alles bisher Übergebene geschrieben ist
+        done = threading.Event()
+        self.call(done.set)
+        done.wait()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            kind, payload = job
+            try:
+                if kind == "series":
+                    measurement, tags, epoch_seconds, values = payload
+                    started = time.perf_counter()
+                    written = self.backend.write_series(measurement, tags, epoch_seconds, values,
+                                                        batch_size=self.batch_size)
+                    elapsed = time.perf_counter() - started
+                    self.rows += written
+                    self.seconds += elapsed
+                    if measurement == "energy" and written:
+                        print(f" {written} Werte für {tags['entity_id']} geschrieben "
+                              f"({written / max(elapsed, 1e-6):.0f} Werte/s).")
+                else:
+                    func, args = payload
+                    func(*args)
+            except Exception as e:
+                self.errors.append(e)
+                print(f" Fehler beim Schreiben ({self.backend.name}): {e}")
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
@@ -0,0 +1,174 @@
+import argparse
+import json
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from common import load_config
+from influx_query_generator import (ROLLUP_MEASUREMENTS, generate_batched_influx_query, generate_influx_query,
+                                    generate_rollup_query, generate_rollup_total_query, get_sensor_types)
+from sensor_types import DEFAULT_TYPES_FILE, load_sensor_types, types_by_friendly_name
+
+# Abfragen ohne Oberfläche erzeugen, ausführen und messen, z. B. per cron oder SSH:
+#   python influx_query_cli.py time --periods 1h,1d --repeat 5 --explain --json
+# raw: je Sensor und Zeitintervall eine Abfrage auf energy (mit --batched eine je Zeitintervall für alle Sensoren).
+# rollup/total: die Abfragen des Dashboards auf energy_1h/1d/1mo (Ansichten bzw. Summe je Sensor).
+
+def connect(config):
+    from instrumented_influx import InstrumentedInfluxDBClient
+    settings = config["influxdb"]
+    return InstrumentedInfluxDBClient(host=settings["host"], port=settings["port"], database=settings["database"])
+
+def load_types(config, client_factory):
+    # Gespeicherte Sensortypen des Imports; fehlen sie, aus den Serien der InfluxDB lesen
+    types_file = Path(__file__).parent / config.get("import", {}).get("sensor_types_file", DEFAULT_TYPES_FILE)
+    sensor_types = types_by_friendly_name(load_sensor_types(types_file))
+    return sensor_types or get_sensor_types(client_factory())
+
+def build_rollup_queries(source, periods, start, end):
+    build = generate_rollup_total_query if source == "total" else generate_rollup_query
+    return [{"sensor": "*", "period": period, "query": build(period, start, end)} for period in periods]
+
+def build_queries(sensor_types, periods, start, end, tz, batched=False):
+    queries = []
+    for period in periods:
+        if batched:
+            query = generate_batched_influx_query(sensor_types, period=period, start=start, end=end, tz=tz)
+            if query:
+                queries.append({"sensor": "*", "period": period, "query": query})
+            continue
+        for sensor, sensor_type in sorted(sensor_types.items()):
+            query = generate_influx_query(sensor, sensor_type, period=period, start=start, end=end, tz=tz)
+            queries.append({"sensor": sensor, "period": period, "query": query})
+    return queries
+
+def explain(client, query):
+    # EXPLAIN ANALYZE führt die Abfrage aus und liefert den Ausführungsplan mit Zeiten als Textzeilen
+    statement = "; ".join("EXPLAIN ANALYZE " + part for part in query.split("; "))
+    result = client.query(statement)
+    result_sets = result if isinstance(result, list) else [result]
+    return [row[0] for result_set in result_sets for series in result_set.raw.get("series", [])
+            for row in series.get("values") or []]
+
+def run_query(client, entry, repeat=1, include_data=False, with_explain=False):
+    from instrumented_influx import count_rows
+    from instrumentation import start_request_timer
+    runs, http = [], []
+    try:
+        for _ in range(repeat):
+            timer = start_request_timer()
+            started = time.perf_counter()
+            result = client.query(entry["query"], epoch="s")
+            runs.append((time.perf_counter() - started) * 1000)
+            http.append(timer.totals.get("influx", 0.0) * 1000)
+        entry["rows"] = count_rows(result)
+        entry["runs_ms"] = [round(ms, 2) for ms in runs]
+        entry["min_ms"] = round(min(runs), 2)
+        entry["median_ms"] = round(statistics.median(runs), 2)
+        entry["max_ms"] = round(max(runs), 2)
+        entry["http_median_ms"] = round(statistics.median(http), 2)
+        if include_data:
+            result_sets = result if isinstance(result, list) else [result]
+            entry["series"] = [series for result_set in result_sets for series in result_set.raw.get("series", [])]
+        if with_explain:
+            entry["explain"] = explain(client, entry["query"])
+    except Exception as e:
+        entry["error"] = str(e)
+    return entry
+
+def print_entry(entry, command):
+    label = f"{entry['sensor']} [{entry['period']}]"
+    if command == "generate":
+        print(f"-- {label}\n{entry['query']}")
+        return
+    if "error" in entry:
+        print(f"{label}: Fehler: {entry['error']}")
+        return
+    if command == "run":
+        print(f"{label}: {entry['rows']} Zeilen in {entry['min_ms']:.1f} ms")
+    else:
+        print(f"{label}: {entry['rows']} Zeilen, min {entry['min_ms']:.1f} ms, median {entry['median_ms']:.1f} ms "
+              f"(HTTP {entry['http_median_ms']:.1f} ms), max {entry['max_ms']:.1f} ms")
+    for line in entry.get("explain", []):
+        print(f"    {line}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Erzeugt InfluxQL-Abfragen je Sensor und führt sie im Stapel aus.")
+    parser.add_argument("command", choices=("generate", "run", "time", "interactive"),
+                        help="generate: nur ausgeben, run: einmal ausführen, time: mehrfach ausführen und messen, "
+                             "interactive: Dialog (benötigt tkinter)")
+    parser.add_argument("--sensors", default="",
+                        help="Kommagetrennte entity_ids (Standard: alle bekannten Sensoren)")
+    parser.add_argument("--periods", default="1d", help="Kommagetrennte Zeitintervalle, z. B. 1h,1d,1w")
+    parser.add_argument("--start", default=None,
+                        help="Startzeit YYYY-MM-DDTHH:MM:SSZ (Standard: vor 30 Tagen)")
+    parser.add_argument("--end", default=None,
+                        help="Endzeit YYYY-MM-DDTHH:MM:SSZ (optional, bei rollup/total Standard: jetzt)")
+    parser.add_argument("--tz", default=None, help="Zeitzone der Zeitfenster (Standard: timezone in config.json)")
+    parser.add_argument("--source", choices=("raw", "rollup", "total"), default="raw",
+                        help="raw: Rohwerte aus energy je Sensor, rollup: Abfragen der Dashboard-Ansichten, "
+                             "total: Summe je Sensor der Gesamtansicht (rollup/total: --periods aus "
+                             + ", ".join(ROLLUP_MEASUREMENTS) + ")")
+    parser.add_argument("--batched", action="store_true",
+                        help="Bei raw eine Abfrage je Zeitintervall für alle Sensoren statt einer je Sensor")
+    parser.add_argument("--repeat", type=int, default=5, help="Ausführungen je Abfrage bei time")
+    parser.add_argument("--explain", action="store_true", help="Zusätzlich EXPLAIN ANALYZE ausgeben")
+    parser.add_argument("--json", action="store_true", help="Ergebnisse als JSON ausgeben")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "interactive":
+        from influx_query_generator import main as interactive_main
+        interactive_main()
+        return 0
+
+    config = load_config()
+    client = None
+
+    def get_client():
+        nonlocal client
+        if client is None:
+            client = connect(config)
+        return client
+
+    now = datetime.now(timezone.utc)
+    start = args.start or (now - timedelta(days=30)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    periods = [period.strip() for period in args.periods.split(",") if period.strip()]
+    wanted = [name.strip() for name in args.sensors.split(",") if name.strip()]
+    if args.source != "raw":
+        # Die Rollup-Abfragen des Dashboards gelten immer für alle Sensoren (GROUP BY entity_id)
+        unknown = [period for period in periods if period not in ROLLUP_MEASUREMENTS]
+        if unknown or wanted:
+            print(f"Bei --source {args.source} nur --periods aus {', '.join(ROLLUP_MEASUREMENTS)} und keine --sensors.",
+                  file=sys.stderr)
+            return 2
+        entries = build_rollup_queries(args.source, periods, start, args.end or now.strftime("%Y-%m-%dT%H:%M:%SZ"))
+    else:
+        sensor_types = load_types(config, get_client)
+        missing = [name for name in wanted if name not in sensor_types]
+        if missing:
+            print(f"Unbekannte Sensoren: {', '.join(missing)}", file=sys.stderr)
+            return 2
+        if wanted:
+            sensor_types = {name: sensor_types[name] for name in wanted}
+        tz = args.tz if args.tz is not None else config.get("timezone", "Europe/Berlin")
+        entries = build_queries(sensor_types, periods, start, args.end, tz or None, batched=args.batched)
+
+    if args.command != "generate":
+        repeat = max(args.repeat, 1) if args.command == "time" else 1
+        entries = [run_query(get_client(), entry, repeat=repeat, include_data=args.command == "run" and args.json,
+                             with_explain=args.explain) for entry in entries]
+    if args.json:
+        print(json.dumps(entries, indent=2, ensure_ascii=False))
+    else:
+        for entry in entries:
+            print_entry(entry, args.command)
+    if client is not None:
+        client.close()
+    return 1 if any("error" in entry for entry in entries) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
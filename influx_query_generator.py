@@ -1,6 +1,9 @@
+import numpy as np
 
-from influxdb import InfluxDBClient
-from tkinter import Tk, simpledialog
+# Erzeugt die InfluxQL-Abfragen für Dashboard, Import und Export. Das Modul braucht weder
+# influxdb noch tkinter; Abfragen im Stapel ausführen und messen: influx_query_cli.py.
+
+ROLLUP_MEASUREMENTS = {"1h": "energy_1h", "1d": "energy_1d", "1mo": "energy_1mo"}
 
 def get_sensor_type(influx_client, sensor_name):
     query = f"SHOW TAG VALUES FROM energy WITH KEY = \"sensor_type\" WHERE entity_id = '{sensor_name}'"
@@ -9,7 +12,11 @@ def get_sensor_type(influx_client, sensor_name):
         return result[0]["value"]
     return None
 
-def generate_influx_query(sensor_name, sensor_type, period="1d", start=None, end=None):
+def tz_clause(zone):
+    # Zeitfenster von GROUP BY time() an lokalen Tages-/Monatsgrenzen ausrichten
+    return f" tz('{zone}')" if zone else ""
+
+def generate_influx_query(sensor_name, sensor_type, period="1d", start=None, end=None, tz=None):
     if not start:
         start = "now() - 30d"
     where_clause = f"WHERE entity_id = '{sensor_name}' AND time >= '{start}'"
@@ -17,14 +24,122 @@ def generate_influx_query(sensor_name, sensor_type, period="1d", start=None, end
         where_clause += f" AND time < '{end}'"
 
     if sensor_type == 'delta':
-        return f"SELECT sum(\"value\") AS value FROM energy {where_clause} GROUP BY time({period}) fill(0)"
+        return f"SELECT sum(\"value\") AS value FROM energy {where_clause} GROUP BY time({period}) fill(0){tz_clause(tz)}"
     elif sensor_type == 'counter':
-        return f"SELECT sum(\"difference\") FROM (SELECT DIFFERENCE(last(\"value\")) FROM energy {where_clause} GROUP BY time(1h)) GROUP BY time({period}) fill(0)"
+        return f"SELECT sum(\"difference\") FROM (SELECT DIFFERENCE(last(\"value\")) FROM energy {where_clause} GROUP BY time(1h)) GROUP BY time({period}) fill(0){tz_clause(tz)}"
     else:
         raise ValueError("Unbekannter sensor_type: 'delta' oder 'counter' erwartet.")
 
+def _split_series_key(key, sep):
+    parts, current, escaped = [], "", False
+    for ch in key:
+        if escaped:
+            current += ch
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch == sep:
+            parts.append(current)
+            current = ""
+        else:
+            current += ch
+    parts.append(current)
+    return parts
+
+def get_sensor_types(influx_client):
+    # Ein einziger Metadaten-Aufruf liefert alle Serien inkl. entity_id und sensor_type
+    sensor_types = {}
+    for r in influx_client.query("SHOW SERIES FROM energy").get_points():
+        tags = dict(
+            part.split("=", 1) for part in _split_series_key(r["key"], ",")[1:] if "=" in part
+        )
+        entity_id = tags.get("entity_id")
+        if entity_id and entity_id not in sensor_types:
+            sensor_types[entity_id] = tags.get("sensor_type")
+    return sensor_types
+
+def generate_batched_influx_query(sensor_types, period="1d", start=None, end=None, tz=None):
+    if not start:
+        start = "now() - 30d"
+    time_clause = f"time >= '{start}'"
+    if end:
+        time_clause += f" AND time < '{end}'"
+
+    statements = []
+    used_types = set(sensor_types.values())
+    if "delta" in used_types:
+        statements.append(
+            f"SELECT sum(\"value\") AS value FROM energy WHERE sensor_type = 'delta' AND {time_clause} "
+            f"GROUP BY time({period}), entity_id fill(0){tz_clause(tz)}"
+        )
+    if "counter" in used_types:
+        statements.append(
+            f"SELECT sum(\"difference\") AS value FROM (SELECT DIFFERENCE(last(\"value\")) FROM energy "
+            f"WHERE sensor_type = 'counter' AND {time_clause} GROUP BY time(1h), entity_id) "
+            f"GROUP BY time({period}), entity_id fill(0){tz_clause(tz)}"
+        )
+    return "; ".join(statements)
+
+def generate_rollup_query(resolution, start, end):
+    measurement = ROLLUP_MEASUREMENTS[resolution]
+    return f"SELECT \"value\" FROM {measurement} WHERE time >= '{start}' AND time < '{end}' GROUP BY entity_id"
+
+def generate_rollup_total_query(resolution, start, end):
+    # Summe je Sensor in der Datenbank bilden; übertragen wird nur eine Zeile pro Sensor
+    measurement = ROLLUP_MEASUREMENTS[resolution]
+    return (f"SELECT sum(\"value\") AS value FROM {measurement} "
+            f"WHERE \"value\" > 0 AND time >= '{start}' AND time < '{end}' GROUP BY entity_id")
+
+def query_rollup_totals(influx_client, resolution, start, end):
+    result = influx_client.query(generate_rollup_total_query(resolution, start, end), epoch='s')
+    return {
+        tags["entity_id"]: point["value"] or 0.0
+        for (_, tags), points in result.items() if tags and "entity_id" in tags
+        for point in points
+    }
+
+def query_rollup_arrays(influx_client, resolution, start, end):
+    # Epoch-Sekunden statt ISO-Strings; je Sensor zwei Spalten (Zeit, Wert) ohne dict pro Punkt
+    result = influx_client.query(generate_rollup_query(resolution, start, end), epoch='s')
+    arrays = {}
+    for series in result.raw.get("series", []):
+        values = np.array(series["values"], dtype=np.float64).reshape(-1, 2)
+        arrays[series["tags"]["entity_id"]] = (values[:, 0].astype(np.int64), values[:, 1])
+    return arrays
+
+def generate_daily_count_query(measurement, start, end):
+    # Anzahl Werte je UTC-Tag und Sensor, für den Abgleich mit der Quelle beim Import
+    return (f"SELECT count(\"value\") FROM \"{measurement}\" WHERE time >= '{start}' AND time < '{end}' "
+            f"GROUP BY time(1d), entity_id fill(none)")
+
+def query_daily_counts(influx_client, measurement, start, end):
+    result = influx_client.query(generate_daily_count_query(measurement, start, end), epoch='s')
+    return {
+        series["tags"]["entity_id"]: {int(ts): int(count) for ts, count in series["values"]}
+        for series in result.raw.get("series", [])
+    }
+
+def generate_export_query(measurement, start, end, sensors=None):
+    sensor_clause = ""
+    if sensors:
+        names = " OR ".join("entity_id = '" + name.replace("\\", "\\\\").replace("'", "\\'") + "'" for name in sensors)
+        sensor_clause = f" AND ({names})"
+    return (f"SELECT \"value\" FROM \"{measurement}\" WHERE time >= '{start}' AND time < '{end}'{sensor_clause} "
+            f"GROUP BY entity_id")
+
+def iter_export_chunks(influx_client, measurement, start, end, sensors=None, chunk_size=10000):
+    # Chunked-Antwort der InfluxDB: je Block und Sensor (entity_id, Zeiten, Werte), ohne alles zu sammeln
+    query = generate_export_query(measurement, start, end, sensors)
+    for result in influx_client.query(query, epoch='s', chunked=True, chunk_size=chunk_size):
+        for series in result.raw.get("series", []):
+            values = np.array(series["values"], dtype=np.float64).reshape(-1, 2)
+            yield series["tags"]["entity_id"], values[:, 0].astype(np.int64), values[:, 1]
+
 def main():
+    # Interaktive Abfrage per Dialog; tkinter und influxdb werden erst hier geladen
     import sys
+    from tkinter import Tk, simpledialog
+    from influxdb import InfluxDBClient
     root = Tk()
     root.withdraw()
 
@@ -36,6 +151,7 @@ def main():
     period = simpledialog.askstring("Zeitintervall", "Zeitintervall (z. B. 1d, 1h, 1w):", initialvalue="1d")
     start = simpledialog.askstring("Startzeit", "Startzeit (YYYY-MM-DDTHH:MM:SSZ, optional):")
     end = simpledialog.askstring("Endzeit", "Endzeit (YYYY-MM-DDTHH:MM:SSZ, optional):")
+    tz = simpledialog.askstring("Zeitzone", "Zeitzone für die Zeitfenster (leer = UTC):", initialvalue="Europe/Berlin")
 
     influx_client = InfluxDBClient(host="localhost", port=8086)
     influx_client.switch_database("hadb")
@@ -45,7 +161,7 @@ def main():
         print(f"sensor_type für '{sensor_name}' nicht gefunden.")
         sys.exit(1)
 
-    query = generate_influx_query(sensor_name, sensor_type, period=period, start=start, end=end)
+    query = generate_influx_query(sensor_name, sensor_type, period=period, start=start, end=end, tz=tz)
     print("\nGenerierte InfluxQL-Abfrage:")
     print(query)
 
@@ -0,0 +1,113 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Zeitmessung für Dashboard und Import: Spans je Request (Server-Timing-Header) und
+# prozessweite Kennzahlen im Prometheus-Textformat (/metrics). Der messende InfluxDB-Client
+# liegt in instrumented_influx.py, damit influxdb (und darüber pandas) erst bei Bedarf geladen wird.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class StageTimer:
+    def __init__(self):
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.totals[name] = self.totals.get(name, 0.0) + seconds
+
+    @contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def reset(self):
+        with self._lock:
+            self.totals = {}
+
+    def summary(self):
+        with self._lock:
+            return ", ".join(f"{name} {seconds:.2f} s" for name, seconds in self.totals.items())
+
+    def server_timing(self):
+        with self._lock:
+            return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.totals.items())
+
+def _format_labels(labels):
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in labels) + "}" if labels else ""
+
+class Metrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, help="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, ("counter", help))
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, help="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, ("histogram", help))
+            counts, total, count = self._histograms.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+            self._histograms[key] = (counts, total + seconds, count + 1)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (kind, help) in sorted(self._help.items()):
+                if help:
+                    lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "counter":
+                    for (metric, labels), value in sorted(self._counters.items()):
+                        if metric == name:
+                            lines.append(f"{name}{_format_labels(labels)} {value}")
+                    continue
+                for (metric, labels), (counts, total, count) in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, bucket_count in zip(self.buckets, counts):
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {bucket_count}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+_request_timer = ContextVar("request_timer", default=None)
+
+def start_request_timer():
+    timer = StageTimer()
+    _request_timer.set(timer)
+    return timer
+
+def current_timer():
+    return _request_timer.get()
+
+@contextmanager
+def span(name):
+    # Misst einen Abschnitt des laufenden Requests; außerhalb eines Requests nur für /metrics
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timer = _request_timer.get()
+        if timer is not None:
+            timer.add(name, elapsed)
+        metrics.observe("hadb_stage_seconds", elapsed, help="Dauer der Verarbeitungsschritte im Dashboard",
+                        stage=name)
@@ -0,0 +1,59 @@
+import re
+import threading
+import time
+
+from influxdb import InfluxDBClient
+
+from instrumentation import current_timer, metrics
+
+# InfluxDB-Client, der jede Abfrage misst (HTTP und JSON-Decoding getrennt) und auf Wunsch
+# mit Dauer und Zeilenzahl protokolliert. Das Paket influxdb lädt beim Import pandas mit;
+# das Dashboard importiert dieses Modul daher erst, wenn es eine Verbindung braucht.
+
+def count_rows(result):
+    result_sets = result if isinstance(result, list) else [result]
+    return sum(len(series.get("values") or []) for result_set in result_sets
+               for series in result_set.raw.get("series", []))
+
+class InstrumentedInfluxDBClient(InfluxDBClient):
+    def __init__(self, *args, log_queries=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.log_queries = log_queries
+        self._http = threading.local()
+
+    def request(self, *args, **kwargs):
+        # Nur die HTTP-Anfrage; das JSON-Decoding folgt danach in query()
+        started = time.perf_counter()
+        try:
+            return super().request(*args, **kwargs)
+        finally:
+            self._http.seconds = time.perf_counter() - started
+
+    def query(self, query, *args, **kwargs):
+        match = re.search(r'FROM "?(\w+)', query)
+        measurement = match.group(1) if match else "-"
+        self._http.seconds = 0.0
+        started = time.perf_counter()
+        try:
+            result = super().query(query, *args, **kwargs)
+        except Exception:
+            metrics.inc("hadb_influx_errors_total", help="Fehlgeschlagene InfluxDB-Abfragen", measurement=measurement)
+            raise
+        elapsed = time.perf_counter() - started
+        http_seconds = self._http.seconds
+
+        timer = current_timer()
+        if timer is not None:
+            timer.add("influx", http_seconds)
+            timer.add("decode", elapsed - http_seconds)
+        metrics.observe("hadb_influx_query_seconds", elapsed, help="Dauer der InfluxDB-Abfragen inkl. Decoding",
+                        measurement=measurement)
+        rows = None
+        if not kwargs.get("chunked"):
+            rows = count_rows(result)
+            metrics.inc("hadb_influx_rows_total", rows, help="Von der InfluxDB gelieferte Zeilen",
+                        measurement=measurement)
+        if self.log_queries:
+            print(f"[InfluxQL] {elapsed * 1000:.1f} ms (HTTP {http_seconds * 1000:.1f} ms), "
+                  f"{rows if rows is not None else '?'} Zeilen: {query}")
+        return result
@@ -0,0 +1,32 @@
+import numpy as np
+
+DEFAULT_BATCH_SIZE = 5000
+
+def escape_tag(value):
+    return str(value).replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+def series_prefix(measurement, tags):
+    measurement = str(measurement).replace(",", "\\,").replace(" ", "\\ ")
+    tag_str = "".join(f",{escape_tag(k)}={escape_tag(v)}" for k, v in sorted(tags.items()))
+    return measurement + tag_str
+
+def format_lines(prefix, epoch_seconds, values, field="value"):
+    # Zeilen spaltenweise zusammensetzen statt je Datensatz ein dict/Series zu erzeugen
+    values = np.asarray(values, dtype=np.float64)
+    epoch_seconds = np.asarray(epoch_seconds).astype(np.int64)
+    valid = np.isfinite(values)
+    value_str = values[valid].astype(str).astype(object)
+    time_str = epoch_seconds[valid].astype(str).astype(object)
+    return f"{prefix} {field}=" + value_str + " " + time_str
+
+def write_series(influx_client, measurement, tags, epoch_seconds, values, batch_size=DEFAULT_BATCH_SIZE, field="value"):
+    prefix = series_prefix(measurement, tags)
+    epoch_seconds = np.asarray(epoch_seconds)
+    values = np.asarray(values)
+    written = 0
+    for i in range(0, len(values), batch_size):
+        lines = format_lines(prefix, epoch_seconds[i:i + batch_size], values[i:i + batch_size], field=field)
+        if len(lines):
+            influx_client.write_points(lines.tolist(), time_precision='s', protocol='line')
+            written += len(lines)
+    return written
@@ -0,0 +1,35 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:  # optional, sonst gzip
+    brotli = None
+
+# Komprimiert Antworten des Dashboards (JSON, HTML) je nach Accept-Encoding mit Brotli oder gzip.
+# Gestreamte Antworten und kleine Antworten bleiben unverändert.
+
+COMPRESSIBLE = {"application/json", "text/html", "text/plain", "text/csv", "application/javascript"}
+
+def choose_encoding(accept_encodings):
+    if brotli is not None and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+def compress_response(response, accept_encodings, min_bytes=1024, level=6):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(accept_encodings)
+    data = response.get_data()
+    if encoding is None or len(data) < min_bytes:
+        return response
+    if encoding == "br":
+        compressed = brotli.compress(data, quality=min(level, 11))
+    else:
+        compressed = gzip.compress(data, compresslevel=min(level, 9), mtime=0)
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -0,0 +1,111 @@
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+
+from common import save_json
+
+# Sensortyp (counter/delta) einmal je Sensor bestimmen und in SQLite/sensor_types.json
+# festhalten. Importer und Dashboard lesen den gespeicherten Typ, damit ein kleiner
+# inkrementeller Import die Einordnung nicht kippen und keine zweite Influx-Serie
+# mit abweichendem sensor_type-Tag anlegen kann.
+
+SAMPLE_SIZE = 500
+DEFAULT_TYPES_FILE = "SQLite/sensor_types.json"
+# Faktor je Energieeinheit nach kWh; die Verdichtungen werden immer in kWh geschrieben
+ENERGY_UNITS = {"Wh": 0.001, "kWh": 1, "MWh": 1000, "GWh": 1000000}
+
+def detect_sensor_type(state, sums):
+    # Zähler: state entspricht (nahezu) der laufenden Summe; delta: state ist der Verbrauch je Stunde
+    state = np.asarray(state, dtype=np.float64)
+    sums = np.asarray(sums, dtype=np.float64)
+    valid = np.isfinite(state) & np.isfinite(sums)
+    if not valid.any():
+        return "unknown"
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.minimum(state[valid] / sums[valid], 1)
+    return "counter" if (ratio > 0.9).mean() > 0.9 else "delta"
+
+def get_statistics_meta(conn, sensor_ids):
+    placeholders = ", ".join("?" for _ in sensor_ids)
+    rows = conn.execute(
+        f"SELECT statistic_id, id, has_sum, unit_of_measurement FROM statistics_meta "
+        f"WHERE statistic_id IN ({placeholders})",
+        list(sensor_ids)).fetchall()
+    return {statistic_id: (metadata_id, has_sum, unit) for statistic_id, metadata_id, has_sum, unit in rows}
+
+def detect_from_sample(conn, metadata_id, has_sum=None, sample_size=SAMPLE_SIZE):
+    # Ohne Summenspalte (has_sum = 0) kann es weder Zähler- noch Verbrauchswerte geben
+    if has_sum is not None and not has_sum:
+        return "unknown", 0
+    rows = conn.execute(
+        "SELECT state, sum FROM statistics WHERE metadata_id = ? AND state IS NOT NULL AND sum IS NOT NULL "
+        "ORDER BY start_ts DESC LIMIT ?", (int(metadata_id), sample_size)).fetchall()
+    if not rows:
+        return None, 0
+    sample = np.array(rows, dtype=np.float64)
+    return detect_sensor_type(sample[:, 0], sample[:, 1]), len(rows)
+
+def kwh_factor(unit):
+    # Unbekannte oder fehlende Einheiten werden wie bisher als kWh übernommen
+    return ENERGY_UNITS.get(unit, 1)
+
+def load_sensor_types(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_sensor_types(path, sensor_types):
+    save_json(path, sensor_types)
+
+def resolve_sensor_types(conn, sensors, stored, influx_types=None, redetect=False):
+    # sensors: [(statistic_id, friendly_name)]; liefert statistic_id -> Eintrag mit metadata_id und sensor_type.
+    # Neu bestimmt wird nur, was fehlt oder dessen metadata_id sich geändert hat. Ein bereits in der
+    # InfluxDB vorhandener Typ hat Vorrang, damit bestehende Serien fortgeführt werden.
+    meta = get_statistics_meta(conn, [sensor_id for sensor_id, _ in sensors])
+    resolved = dict(stored)
+    changed = False
+    for sensor_id, friendly_name in sensors:
+        if sensor_id not in meta:
+            continue
+        metadata_id, has_sum, unit = meta[sensor_id]
+        entry = stored.get(sensor_id)
+        if (not redetect and entry and entry.get("metadata_id") == metadata_id
+                and entry.get("sensor_type") in ("delta", "counter")):
+            # Die Einheit bestimmt den Faktor nach kWh und wird daher ebenfalls aktuell gehalten
+            if entry.get("friendly_name") != friendly_name or entry.get("unit") != unit:
+                resolved[sensor_id] = dict(entry, friendly_name=friendly_name, unit=unit)
+                changed = True
+            continue
+
+        existing = (influx_types or {}).get(friendly_name)
+        if existing in ("delta", "counter") and not redetect:
+            sensor_type, sample_rows, source = existing, 0, "influxdb"
+        else:
+            sensor_type, sample_rows = detect_from_sample(conn, metadata_id, has_sum)
+            source = "sample"
+        if sensor_type is None:
+            # Noch keine Statistik vorhanden; beim nächsten Import erneut versuchen
+            continue
+        if unit and unit not in ENERGY_UNITS:
+            print(f" Hinweis: {sensor_id} hat die Einheit {unit}, erwartet wird eine Energieeinheit.")
+        resolved[sensor_id] = {
+            "friendly_name": friendly_name,
+            "metadata_id": metadata_id,
+            "sensor_type": sensor_type,
+            "unit": unit,
+            "source": source,
+            "sample_rows": sample_rows,
+            "detected": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        changed = True
+        print(f" Sensortyp für {friendly_name}: {sensor_type} ({source})")
+    return resolved, changed
+
+def types_by_friendly_name(sensor_types):
+    return {
+        entry["friendly_name"]: entry["sensor_type"]
+        for entry in sensor_types.values() if entry.get("sensor_type") in ("delta", "counter")
+    }
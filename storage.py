@@ -0,0 +1,301 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from common import parse_utc, parse_utc_datetime, save_json
+from influx_query_generator import (get_sensor_types, iter_export_chunks, query_daily_counts, query_rollup_arrays,
+                                    query_rollup_totals)
+from instrumentation import span
+from line_protocol import DEFAULT_BATCH_SIZE, write_series
+
+# Speicher-Backends für Importer und Dashboard. InfluxBackend spricht wie bisher die InfluxDB an;
+# LocalStoreBackend hält je Sensor die verbrauchten kWh pro Stunde als memory-mapped NumPy-Array
+# (float64, ein Eintrag je Stunde seit base_hour, fehlende Stunden NaN) plus einen kleinen Katalog.
+# Tages- und Monatswerte werden beim Lesen aus Array-Ausschnitten gebildet.
+
+HOUR = 3600
+DAY = 86400
+# Auflösungen für den Export und ihre Measurements
+EXPORT_MEASUREMENTS = {"raw": "energy", "5m": "energy_5m", "1h": "energy_1h", "1d": "energy_1d", "1mo": "energy_1mo"}
+
+def local_bucket_starts(start_ts, end_ts, resolution, zone):
+    # Lokale Tages- bzw. Monatsanfänge im Bereich [start_ts, end_ts) als Epoch-Sekunden
+    current = datetime.fromtimestamp(start_ts, tz=timezone.utc).astimezone(zone)
+    if resolution == "1mo":
+        current = datetime(current.year, current.month, 1, tzinfo=zone)
+    else:
+        current = datetime(current.year, current.month, current.day, tzinfo=zone)
+    starts = []
+    while current.timestamp() < end_ts:
+        starts.append(int(current.timestamp()))
+        if resolution == "1mo":
+            current = datetime(current.year + (current.month == 12), current.month % 12 + 1, 1, tzinfo=zone)
+        else:
+            current = datetime.combine(current.date() + timedelta(days=1), datetime.min.time(), tzinfo=zone)
+    return np.array(starts, dtype=np.int64)
+
+class InfluxBackend:
+    name = "influxdb"
+
+    def __init__(self, influx_client):
+        self.influx_client = influx_client
+
+    def sensor_types(self):
+        return get_sensor_types(self.influx_client)
+
+    def rollup_arrays(self, resolution, start, end):
+        return query_rollup_arrays(self.influx_client, resolution, start, end)
+
+    def rollup_totals(self, resolution, start, end):
+        return query_rollup_totals(self.influx_client, resolution, start, end)
+
+    def latest_timestamps(self, measurement="energy"):
+        # Ein Aufruf für alle Sensoren statt je Sensor ein SELECT last(...)
+        query = f'SELECT last("value") FROM "{measurement}" GROUP BY entity_id'
+        latest = {}
+        for (_, tags), points in self.influx_client.query(query).items():
+            for point in points:
+                try:
+                    latest[tags["entity_id"]] = parse_utc_datetime(point['time'])
+                except Exception as e:
+                    print(f" Fehler beim Lesen des Zeitstempels für {tags.get('entity_id')}: {e}")
+        return latest
+
+    def iter_points(self, resolution, start, end, sensors=None, chunk_size=10000):
+        return iter_export_chunks(self.influx_client, EXPORT_MEASUREMENTS[resolution], start, end, sensors,
+                                  chunk_size)
+
+    # Abgleich mit der Quelle: die Rohwerte entsprechen Zeile für Zeile der statistics-Tabelle
+    coverage_measurement = "energy"
+
+    def daily_counts(self, measurement, start, end):
+        return query_daily_counts(self.influx_client, measurement, start, end)
+
+    def write_series(self, measurement, tags, epoch_seconds, values, batch_size=DEFAULT_BATCH_SIZE):
+        return write_series(self.influx_client, measurement, tags, epoch_seconds, values, batch_size=batch_size)
+
+    def close(self):
+        self.influx_client.close()
+
+class LocalStoreBackend:
+    name = "local"
+    CATALOG = "catalog.json"
+
+    def __init__(self, path, zone="Europe/Berlin"):
+        self.path = Path(path)
+        self.zone = ZoneInfo(zone) if isinstance(zone, str) else zone
+        self._lock = threading.RLock()
+        self._catalog = None
+        self._catalog_mtime = None
+        self._arrays = {}
+
+    # --- Katalog -------------------------------------------------------------------------------
+
+    def catalog(self):
+        catalog_file = self.path / self.CATALOG
+        try:
+            mtime = catalog_file.stat().st_mtime_ns
+        except OSError:
+            return {}
+        with self._lock:
+            if self._catalog is None or mtime != self._catalog_mtime:
+                with open(catalog_file, "r") as f:
+                    self._catalog = json.load(f)
+                self._catalog_mtime = mtime
+            return self._catalog
+
+    def _save_catalog(self, catalog):
+        save_json(self.path / self.CATALOG, catalog)
+        self._catalog = catalog
+        self._catalog_mtime = (self.path / self.CATALOG).stat().st_mtime_ns
+
+    def sensor_types(self):
+        return {entity_id: entry.get("sensor_type") for entity_id, entry in self.catalog().items()}
+
+    # --- Lesen ---------------------------------------------------------------------------------
+
+    def hourly(self, entity_id):
+        # Nur-Lese-Sicht auf die Stundenwerte; wird erst neu geöffnet, wenn das Array gewachsen ist
+        entry = self.catalog().get(entity_id)
+        if not entry or not entry["hours"]:
+            return None, None
+        key = (entry["file"], entry["base_hour"], entry["hours"])
+        with self._lock:
+            array = self._arrays.get(entity_id)
+            if array is None or array[0] != key:
+                data = np.memmap(self.path / entry["file"], dtype="<f8", mode="r", shape=(entry["hours"],))
+                array = (key, data)
+                self._arrays[entity_id] = array
+        return entry["base_hour"], array[1]
+
+    def _hour_slice(self, entity_id, start_ts, end_ts):
+        base_hour, data = self.hourly(entity_id)
+        if data is None:
+            return None, None
+        lo = min(max(start_ts // HOUR - base_hour, 0), len(data))
+        hi = min(max(-(-end_ts // HOUR) - base_hour, 0), len(data))
+        return base_hour + lo, data[lo:hi]
+
+    def rollup_arrays(self, resolution, start, end):
+        with span("store"):
+            return self._rollup_arrays(resolution, start, end)
+
+    def _rollup_arrays(self, resolution, start, end, sensors=None):
+        start_ts, end_ts = parse_utc(start), parse_utc(end)
+        edges = None
+        if resolution != "1h":
+            starts = local_bucket_starts(start_ts, end_ts, resolution, self.zone)
+            edges = np.append(starts, end_ts)
+        arrays = {}
+        for entity_id in sensors or self.catalog():
+            first_hour, values = self._hour_slice(entity_id, start_ts, end_ts)
+            if values is None or not len(values):
+                continue
+            times = (first_hour + np.arange(len(values), dtype=np.int64)) * HOUR
+            if edges is None:
+                # Direkt der Ausschnitt aus der Datei, ohne Kopie
+                arrays[entity_id] = (times, values)
+                continue
+            # Summen je lokalem Tag/Monat über kumulierte Summen des Ausschnitts
+            finite = np.isfinite(values)
+            cumulative = np.concatenate(([0.0], np.cumsum(np.where(finite, values, 0.0))))
+            counts = np.concatenate(([0], np.cumsum(finite)))
+            positions = np.searchsorted(times, edges)
+            has_data = counts[positions[1:]] > counts[positions[:-1]]
+            sums = cumulative[positions[1:]] - cumulative[positions[:-1]]
+            arrays[entity_id] = (edges[:-1][has_data], sums[has_data])
+        return arrays
+
+    def iter_points(self, resolution, start, end, sensors=None, chunk_size=10000):
+        # Auflösung vor dem ersten Block prüfen, damit der Fehler noch als 400 beantwortet werden kann
+        if resolution not in ("1h", "1d", "1mo"):
+            raise ValueError(f"Auflösung {resolution} ist im lokalen Speicher nicht vorhanden")
+        return self._iter_points(resolution, start, end, sensors, chunk_size)
+
+    def _iter_points(self, resolution, start, end, sensors, chunk_size):
+        for entity_id in sensors or sorted(self.catalog()):
+            if entity_id not in self.catalog():
+                continue
+            if resolution != "1h":
+                for name, (times, values) in self._rollup_arrays(resolution, start, end, [entity_id]).items():
+                    yield name, times, values
+                continue
+            start_ts, end_ts = parse_utc(start), parse_utc(end)
+            first_hour, values = self._hour_slice(entity_id, start_ts, end_ts)
+            if values is None:
+                continue
+            # Blockweise aus der memory-mapped Datei, fehlende Stunden werden ausgelassen
+            for offset in range(0, len(values), chunk_size):
+                block = np.asarray(values[offset:offset + chunk_size])
+                valid = np.isfinite(block)
+                if valid.any():
+                    times = (first_hour + offset + np.arange(len(block), dtype=np.int64)) * HOUR
+                    yield entity_id, times[valid], block[valid]
+
+    def rollup_totals(self, resolution, start, end):
+        return {
+            entity_id: float(values[values > 0].sum())
+            for entity_id, (_, values) in self.rollup_arrays(resolution, start, end).items()
+        }
+
+    def latest_timestamps(self, measurement="energy"):
+        key = "last_raw_ts" if measurement == "energy" else "last_hour_ts" if measurement == "energy_1h" else None
+        if key is None:
+            return {}
+        return {
+            entity_id: datetime.fromtimestamp(entry[key], tz=timezone.utc)
+            for entity_id, entry in self.catalog().items() if entry.get(key) is not None
+        }
+
+    # Rohwerte werden nicht gehalten, abgeglichen werden die Stundenwerte
+    coverage_measurement = "energy_1h"
+
+    def daily_counts(self, measurement, start, end):
+        start_ts, end_ts = parse_utc(start), parse_utc(end)
+        counts = {}
+        for entity_id in self.catalog():
+            first_hour, values = self._hour_slice(entity_id, start_ts, end_ts)
+            if values is None or not len(values):
+                continue
+            days = (first_hour + np.arange(len(values), dtype=np.int64)) * HOUR // DAY
+            per_day = np.bincount(days - days[0], weights=np.isfinite(values))
+            counts[entity_id] = {int(days[0] + i) * DAY: int(n) for i, n in enumerate(per_day) if n}
+        return counts
+
+    # --- Schreiben (nur aus dem Schreib-Thread des Importers) ----------------------------------
+
+    def _file_name(self, entity_id):
+        return hashlib.sha1(entity_id.encode("utf-8")).hexdigest()[:16] + ".f64"
+
+    def _write_hours(self, entry, hours, values):
+        file_path = self.path / entry["file"]
+        base_hour = entry["base_hour"]
+        if base_hour is None:
+            base_hour = int(hours.min())
+        elif hours.min() < base_hour:
+            # Werte vor dem bisherigen Anfang: Datei nach vorne erweitert neu schreiben und austauschen.
+            # Nie in place kürzen: das Dashboard kann die alte Datei gerade memory-mapped lesen.
+            shift = base_hour - int(hours.min())
+            old = np.fromfile(file_path, dtype="<f8", count=entry["hours"]) if file_path.exists() else np.empty(0)
+            tmp_file = file_path.with_name(file_path.name + ".tmp")
+            np.concatenate((np.full(shift, np.nan), old)).astype("<f8").tofile(tmp_file)
+            os.replace(tmp_file, file_path)
+            base_hour -= shift
+            entry["hours"] += shift
+        needed = int(hours.max()) - base_hour + 1
+        if needed > entry["hours"]:
+            # Anhängen: neue Stunden zunächst als NaN (fehlend)
+            with open(file_path, "ab") as f:
+                np.full(needed - entry["hours"], np.nan, dtype="<f8").tofile(f)
+            entry["hours"] = needed
+        data = np.memmap(file_path, dtype="<f8", mode="r+", shape=(entry["hours"],))
+        data[hours - base_hour] = values
+        data.flush()
+        del data
+        entry["base_hour"] = base_hour
+
+    def write_series(self, measurement, tags, epoch_seconds, values, batch_size=None):
+        entity_id = tags["entity_id"]
+        epoch_seconds = np.asarray(epoch_seconds).astype(np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        valid = np.isfinite(values)
+        if measurement not in ("energy", "energy_1h") or not valid.any():
+            # Tage und Monate werden beim Lesen gebildet, 5-Minuten-Werte nicht gespeichert
+            return 0
+        with self._lock:
+            catalog = {name: dict(entry) for name, entry in self.catalog().items()}
+            entry = catalog.setdefault(entity_id, {
+                "file": self._file_name(entity_id), "base_hour": None, "hours": 0,
+                "sensor_type": None, "last_raw_ts": None, "last_hour_ts": None,
+            })
+            if measurement == "energy":
+                entry["sensor_type"] = tags.get("sensor_type", entry["sensor_type"])
+                entry["last_raw_ts"] = max(int(epoch_seconds[valid].max()), entry["last_raw_ts"] or 0)
+            else:
+                hours = epoch_seconds[valid] // HOUR
+                self.path.mkdir(parents=True, exist_ok=True)
+                self._write_hours(entry, hours, values[valid])
+                entry["last_hour_ts"] = max(int(hours.max()) * HOUR, entry["last_hour_ts"] or 0)
+            self._save_catalog(catalog)
+        return int(valid.sum())
+
+    def close(self):
+        with self._lock:
+            self._arrays.clear()
+
+def backend_name(config):
+    return "local" if config.get("storage", {}).get("backend", "influxdb") == "local" else "influxdb"
+
+def create_backend(config, influx_client_factory):
+    # storage.backend in config.json: "influxdb" (Standard) oder "local"; der InfluxDB-Client wird nur bei Bedarf angelegt
+    storage = config.get("storage", {})
+    if storage.get("backend", "influxdb") == "local":
+        path = Path(__file__).parent / storage.get("path", "SQLite/hourly_store")
+        return LocalStoreBackend(path, zone=config.get("timezone", "Europe/Berlin"))
+    return InfluxBackend(influx_client_factory())